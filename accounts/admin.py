@@ -64,7 +64,7 @@ class UserAnswerAdmin(admin.ModelAdmin):
 
 @admin.register(UserMatch)
 class UserMatchAdmin(admin.ModelAdmin):
-    list_display = ('user1', 'user2', 'compatibility_score', 'status', 'created_at')
+    list_display = ('user1', 'user2', 'initiator', 'compatibility_score', 'status', 'created_at')
     list_filter = ('status',)
     search_fields = ('user1__email', 'user2__email')
     ordering = ('-compatibility_score',)
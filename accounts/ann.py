@@ -0,0 +1,181 @@
+"""
+Approximate nearest-neighbour index over answer vectors.
+
+``RandomProjectionIndex`` is a cosine LSH index: each of ``n_tables`` hash
+tables buckets a vector by the signs of ``n_bits`` random projections.
+A query only scores the vectors sharing a bucket with it in at least one
+table, then re-ranks those candidates with the exact cosine similarity.
+More tables raise recall, more bits shrink buckets; ``measure_recall``
+compares the index against an exact scan to tune both.
+"""
+import time
+
+import numpy as np
+
+
+class RandomProjectionIndex:
+    def __init__(self, dim, n_tables=16, n_bits=8, probe_neighbours=True, center=None, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probe_neighbours = probe_neighbours
+        self.planes = rng.standard_normal((n_tables, dim, n_bits)).astype(np.float32)
+        # Answer vectors are non-negative, so hashing around the population
+        # mean spreads them over far more buckets than hashing around zero
+        self.center = np.zeros(dim, dtype=np.float32) if center is None else np.asarray(center, dtype=np.float32)
+        self._powers = 1 << np.arange(n_bits)
+        self._tables = [{} for _ in range(n_tables)]
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._codes = np.zeros((0, n_tables), dtype=np.int64)
+        self._row_of = {}
+        self._free = []
+
+    @classmethod
+    def build(cls, user_ids, matrix, **kwargs):
+        """Create an index over ``matrix`` rows, hashed around their mean."""
+        normalized = _normalize(matrix)
+        center = normalized.mean(axis=0) if len(normalized) else None
+        index = cls(matrix.shape[1], center=center, **kwargs)
+        index.add(user_ids, matrix)
+        return index
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, user_id):
+        return user_id in self._row_of
+
+    def _hash(self, vectors):
+        bits = np.einsum('nd,tdb->ntb', vectors - self.center, self.planes) > 0
+        return bits @ self._powers
+
+    def add(self, user_ids, matrix):
+        """Insert vectors, replacing any already stored for the same users."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.remove(user_ids)
+        normalized = _normalize(matrix)
+        keep = np.linalg.norm(normalized, axis=1) > 0
+        user_ids, normalized = user_ids[keep], normalized[keep]
+        if not len(user_ids):
+            return
+
+        rows = self._allocate(len(user_ids))
+        codes = self._hash(normalized)
+        self._vectors[rows] = normalized
+        self._ids[rows] = user_ids
+        self._codes[rows] = codes
+        self._row_of.update(zip(user_ids.tolist(), rows.tolist()))
+        for table, table_codes in zip(self._tables, codes.T):
+            order = np.argsort(table_codes, kind='stable')
+            unique_codes, starts = np.unique(table_codes[order], return_index=True)
+            for code, bucket_rows in zip(unique_codes.tolist(), np.split(rows[order], starts[1:])):
+                bucket = table.get(code)
+                table[code] = bucket_rows if bucket is None else np.concatenate([bucket, bucket_rows])
+
+    def remove(self, user_ids):
+        for user_id in user_ids:
+            row = self._row_of.pop(int(user_id), None)
+            if row is None:
+                continue
+            for table, code in zip(self._tables, self._codes[row].tolist()):
+                bucket = table[code][table[code] != row]
+                if bucket.size:
+                    table[code] = bucket
+                else:
+                    del table[code]
+            self._free.append(row)
+
+    def _allocate(self, count):
+        reused = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        missing = count - len(reused)
+        if missing:
+            start = len(self._ids)
+            capacity = max(start + missing, 2 * start)
+            grow = capacity - start
+            self._vectors = np.vstack([self._vectors, np.zeros((grow, self.dim), dtype=np.float32)])
+            self._ids = np.concatenate([self._ids, np.zeros(grow, dtype=np.int64)])
+            self._codes = np.vstack([self._codes, np.zeros((grow, self.n_tables), dtype=np.int64)])
+            self._free.extend(range(capacity - 1, start + missing - 1, -1))
+            reused.extend(range(start, start + missing))
+        return np.asarray(reused, dtype=np.int64)
+
+    def candidate_rows(self, vector):
+        """Return the rows sharing a bucket with ``vector`` in any table."""
+        codes = self._hash(_normalize(vector[None, :]))[0].tolist()
+        probes = [0]
+        if self.probe_neighbours:
+            probes += [1 << bit for bit in range(self.n_bits)]
+        buckets = [
+            table[code ^ flip]
+            for table, code in zip(self._tables, codes)
+            for flip in probes
+            if code ^ flip in table
+        ]
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(buckets))
+
+    def query(self, vector, threshold, exclude=()):
+        """
+        Return ``(user_ids, scores)`` of the indexed vectors whose cosine
+        similarity with ``vector`` is above ``threshold``.
+        """
+        norm = np.linalg.norm(vector)
+        rows = self.candidate_rows(vector)
+        if norm == 0 or not rows.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self._vectors[rows] @ (vector / norm).astype(np.float32)
+        keep = scores > threshold
+        user_ids, scores = self._ids[rows[keep]], scores[keep]
+        if len(exclude):
+            allowed = ~np.isin(user_ids, np.asarray(list(exclude), dtype=np.int64))
+            user_ids, scores = user_ids[allowed], scores[allowed]
+        return user_ids, scores
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def measure_recall(index, user_ids, matrix, queries, threshold):
+    """
+    Compare ``index`` against an exact scan of ``matrix``.
+
+    ``queries`` are row positions in ``matrix`` used as query vectors.
+    Returns a dict with the recall of above-threshold pairs, the mean
+    fraction of the population scored per query and both query rates.
+    """
+    normalized = _normalize(matrix)
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+
+    started = time.perf_counter()
+    exact = []
+    for position in queries:
+        scores = normalized @ normalized[position]
+        keep = (scores > threshold) & (user_ids != user_ids[position])
+        exact.append(set(user_ids[keep].tolist()))
+    exact_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    approximate = []
+    for position in queries:
+        found, _ = index.query(matrix[position], threshold, exclude=[user_ids[position]])
+        approximate.append(set(found.tolist()))
+    approximate_seconds = time.perf_counter() - started
+
+    scanned = sum(len(index.candidate_rows(matrix[position])) for position in queries)
+
+    relevant = sum(len(expected) for expected in exact)
+    retrieved = sum(len(expected & found) for expected, found in zip(exact, approximate))
+    count = max(len(queries), 1)
+    return {
+        'recall': retrieved / relevant if relevant else 1.0,
+        'scanned_fraction': scanned / count / max(len(user_ids), 1),
+        'exact_qps': count / exact_seconds if exact_seconds else float('inf'),
+        'index_qps': count / approximate_seconds if approximate_seconds else float('inf'),
+    }
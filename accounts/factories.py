@@ -0,0 +1,143 @@
+"""
+factory-boy factories for synthetic matching populations.
+
+Used by the ``benchmark_matching`` command. Users get a pre-hashed unusable
+password so building thousands of them does not run the password hasher.
+"""
+import random
+
+import factory
+from django.contrib.auth.hashers import make_password
+
+from .models import Profile, Question, QuestionCategory, QuestionChoice, User, UserAnswer
+
+UNUSABLE_PASSWORD = make_password(None)
+
+SHORT_ANSWER_WORDS = [
+    'hiking', 'travel', 'cooking', 'music', 'books', 'movies', 'family', 'faith', 'coffee',
+    'dogs', 'cats', 'football', 'running', 'art', 'dancing', 'nature', 'city', 'beach',
+    'honest', 'kind', 'funny', 'ambitious', 'quiet', 'adventurous', 'loyal', 'curious',
+]
+
+
+class QuestionCategoryFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = QuestionCategory
+
+    name = factory.Sequence(lambda n: f'Category {n}')
+    description = factory.Faker('sentence')
+    weight = factory.Faker('pyfloat', min_value=0.5, max_value=2.0)
+    order = factory.Sequence(lambda n: n)
+
+
+class QuestionFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Question
+
+    category = factory.SubFactory(QuestionCategoryFactory)
+    text = factory.Faker('sentence')
+    question_type = 'single_choice'
+    order = factory.Sequence(lambda n: n)
+
+
+class QuestionChoiceFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = QuestionChoice
+
+    question = factory.SubFactory(QuestionFactory)
+    text = factory.Faker('word')
+    value = factory.Sequence(lambda n: n)
+    order = factory.LazyAttribute(lambda choice: choice.value)
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = User
+
+    email = factory.Sequence(lambda n: f'synthetic{n}@example.com')
+    password = UNUSABLE_PASSWORD
+    first_name = factory.Faker('first_name')
+    last_name = factory.Faker('last_name')
+    email_verified = True
+
+
+class ProfileFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Profile
+
+    user = factory.SubFactory(UserFactory)
+    gender = factory.Faker('random_element', elements=['male', 'female'])
+    looking_for = factory.Faker('random_element', elements=['male', 'female', 'both'])
+    birth_date = factory.Faker('date_of_birth', minimum_age=18, maximum_age=60)
+    min_age_preference = factory.Faker('random_int', min=18, max=30)
+    max_age_preference = factory.Faker('random_int', min=31, max=60)
+
+
+def create_catalog(categories=6, questions_per_category=10, choices_per_question=5):
+    """Create a question catalog cycling through every question type."""
+    question_types = [question_type for question_type, _ in Question.QUESTION_TYPES]
+    questions = []
+    for category in QuestionCategoryFactory.create_batch(categories):
+        for i in range(questions_per_category):
+            question = QuestionFactory(category=category, question_type=question_types[i % len(question_types)])
+            if question.question_type != 'short_answer':
+                for value in range(1, choices_per_question + 1):
+                    QuestionChoiceFactory(question=question, value=value)
+            questions.append(question)
+    return questions
+
+
+def create_population(size, questions, answer_rate=0.8, batch_size=2000, seed=0):
+    """
+    Bulk-insert ``size`` verified users with profiles and answers to a
+    random ``answer_rate`` share of ``questions``.
+
+    Bulk inserts skip model signals and ``save()``, so profiles, text
+    features and choice selections are written explicitly here. Returns the
+    ids of the created users.
+    """
+    from .text_features import featurize_many
+
+    rng = random.Random(seed)
+    choices = {
+        question.pk: list(question.choices.values_list('id', flat=True)) for question in questions
+    }
+    selection_model = UserAnswer.selected_choices.through
+    # Keep synthetic emails clear of users left by earlier populations
+    UserFactory.reset_sequence((User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1)
+    user_ids = []
+    for start in range(0, size, batch_size):
+        users = User.objects.bulk_create(UserFactory.build_batch(min(batch_size, size - start)))
+        Profile.objects.bulk_create([ProfileFactory.build(user=user) for user in users])
+
+        answers = []
+        for user in users:
+            for question in questions:
+                if rng.random() > answer_rate:
+                    continue
+                # Plain constructors: factory overhead dominates at 100k users
+                answer = UserAnswer(user=user, question=question)
+                if question.question_type == 'short_answer':
+                    answer.text_answer = ' '.join(rng.sample(SHORT_ANSWER_WORDS, rng.randint(2, 8)))
+                answers.append(answer)
+        texts = [answer for answer in answers if answer.text_answer]
+        for answer, features in zip(texts, featurize_many([answer.text_answer for answer in texts])):
+            answer.text_features = features.tobytes()
+        answers = UserAnswer.objects.bulk_create(answers)
+
+        selections = []
+        for answer in answers:
+            question_choices = choices[answer.question_id]
+            if not question_choices:
+                continue
+            picked = (
+                rng.sample(question_choices, rng.randint(1, min(3, len(question_choices))))
+                if answer.question.question_type == 'multiple_choice'
+                else [rng.choice(question_choices)]
+            )
+            selections.extend(
+                selection_model(useranswer_id=answer.pk, questionchoice_id=choice_id) for choice_id in picked
+            )
+        selection_model.objects.bulk_create(selections)
+        user_ids.extend(user.pk for user in users)
+    return user_ids
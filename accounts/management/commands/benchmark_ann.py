@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.ann import RandomProjectionIndex, measure_recall
+from accounts.matching import MATCH_THRESHOLD
+from accounts.vectors import get_schema, load_vectors
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure recall and speed of the approximate matching index against an exact scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, nargs='+', default=[8, 16, 32])
+        parser.add_argument('--bits', type=int, nargs='+', default=[6, 8, 10])
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD)
+        parser.add_argument(
+            '--synthetic', type=int, default=0,
+            help='Benchmark on this many random one-hot style vectors instead of the stored ones',
+        )
+        parser.add_argument('--dim', type=int, default=120, help='Width of synthetic vectors')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        if options['synthetic']:
+            user_ids = np.arange(options['synthetic'], dtype=np.int64)
+            matrix = (rng.random((options['synthetic'], options['dim'])) < 0.15).astype(np.float32)
+        else:
+            user_ids, matrix = load_vectors(User.objects.filter(email_verified=True), get_schema())
+        if not len(user_ids):
+            self.stdout.write('No vectors to benchmark')
+            return
+
+        queries = rng.choice(len(user_ids), size=min(options['queries'], len(user_ids)), replace=False)
+        self.stdout.write(f'{len(user_ids)} vectors of width {matrix.shape[1]}, {len(queries)} queries')
+        for n_tables in options['tables']:
+            for n_bits in options['bits']:
+                started = time.perf_counter()
+                index = RandomProjectionIndex.build(user_ids, matrix, n_tables=n_tables, n_bits=n_bits)
+                build_seconds = time.perf_counter() - started
+                result = measure_recall(index, user_ids, matrix, queries, options['threshold'])
+                self.stdout.write(
+                    f"tables={n_tables:<3} bits={n_bits:<3} recall={result['recall']:.3f} "
+                    f"scanned={result['scanned_fraction']:.1%} build={build_seconds:.2f}s "
+                    f"exact={result['exact_qps']:.0f}q/s index={result['index_qps']:.0f}q/s"
+                )
@@ -0,0 +1,141 @@
+import json
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.factories import create_catalog, create_population
+from accounts.matching import MatchingEngine, generate_matches, match_candidates, write_matches
+from accounts.models import User
+from accounts.vectors import ScoringMatrix, get_schema, invalidate_schema, load_vectors, refresh_user_vectors
+from accounts.views import MatchingView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the matching pipeline on synthetic populations. Everything '
+        'runs inside a transaction that is rolled back, so no data is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--sample', type=int, default=20, help='Users to match per population')
+        parser.add_argument('--categories', type=int, default=6)
+        parser.add_argument('--questions-per-category', type=int, default=10)
+        parser.add_argument(
+            '--output',
+            help='Append one JSON line per population to this file, tagged with the git commit',
+        )
+
+    def handle(self, *args, **options):
+        commit = self._git_commit()
+        for size in options['users']:
+            results = {}
+            try:
+                with transaction.atomic():
+                    self._run(size, options, results)
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                # The catalog was rolled back; make every process rebuild its schema
+                invalidate_schema()
+
+            self._report(size, results)
+            if options['output']:
+                with open(options['output'], 'a') as output:
+                    output.write(json.dumps({'commit': commit, 'users': size, 'stages': results}) + '\n')
+
+    def _run(self, size, options, results):
+        # Tracing every allocation would dominate the bulk inserts
+        with self._stage(results, 'populate', trace_memory=False):
+            questions = create_catalog(options['categories'], options['questions_per_category'])
+            user_ids = create_population(size, questions)
+
+        schema = get_schema()
+        with self._stage(results, 'vector_build'):
+            for start in range(0, len(user_ids), 1000):
+                refresh_user_vectors(user_ids[start:start + 1000], schema)
+
+        with self._stage(results, 'vector_load'):
+            population_ids, matrix = load_vectors(User.objects.filter(email_verified=True), schema)
+        for backend, use_sparse in (('dense', False), ('sparse', True)):
+            footprint = ScoringMatrix(matrix, schema, use_sparse=use_sparse).memory_footprint()
+            results[f'{backend}_matrix_bytes'] = footprint['selected']
+        del matrix
+
+        sample = User.objects.filter(pk__in=user_ids[::max(len(user_ids) // options['sample'], 1)][:options['sample']])
+        sample = list(sample.select_related('profile'))
+        engine = MatchingEngine(schema=schema)
+        found = []
+        with self._stage(results, 'scoring', per=len(sample)):
+            for user in sample:
+                found.append((user, engine.find_matches(user, match_candidates(user), limit=settings.MATCHING_MAX_MATCHES)))
+
+        with self._stage(results, 'persistence', per=len(sample)):
+            for user, matches in found:
+                write_matches((user.pk, candidate_id, score) for candidate_id, score in matches)
+
+        with self._stage(results, 'generate_matches', per=len(sample)):
+            for user in sample:
+                generate_matches(user, engine)
+
+        factory = APIRequestFactory()
+        view = MatchingView.as_view()
+        with self._stage(results, 'matching_view', per=len(sample)):
+            for user in sample:
+                request = factory.get('/api/v1/auth/matches/')
+                force_authenticate(request, user=user)
+                view(request).render()
+
+    @contextmanager
+    def _stage(self, results, name, per=1, trace_memory=True):
+        """Record wall time, query count and peak traced memory of a stage."""
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        seconds = time.perf_counter() - started
+        peak = None
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        results[name] = {
+            'seconds': round(seconds, 4),
+            'seconds_per_item': round(seconds / max(per, 1), 4),
+            'queries': len(queries.captured_queries),
+            'peak_memory_bytes': peak,
+        }
+
+    def _report(self, size, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{size} users'))
+        for name, stage in results.items():
+            if isinstance(stage, dict):
+                peak = stage['peak_memory_bytes']
+                self.stdout.write(
+                    f"  {name:<18} {stage['seconds']:>9.3f}s  {stage['seconds_per_item']:>8.4f}s/item  "
+                    f"{stage['queries']:>7} queries  "
+                    + (f"{peak / 2**20:>8.1f} MiB peak" if peak is not None else 'untraced')
+                )
+            else:
+                self.stdout.write(f'  {name:<18} {stage / 2**20:>9.1f} MiB')
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
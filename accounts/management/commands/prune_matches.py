@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.matching import prune_matches
+
+
+class Command(BaseCommand):
+    help = 'Delete rejected matches and stale pending matches past their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending-days', type=int,
+            help='Age of pending matches to delete (default MATCHING_PENDING_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--rejected-days', type=int,
+            help='Age of rejected matches to delete (default MATCHING_REJECTED_RETENTION_DAYS)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Matches deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        deleted = prune_matches(
+            options['pending_days'], options['rejected_days'], options['chunk_size'], options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted['pending']} stale pending and {deleted['rejected']} rejected matches"
+        ))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserAnswer
+from accounts.shared_vectors import publish_vectors
+from accounts.vectors import get_schema, refresh_user_vectors
+
+
+class Command(BaseCommand):
+    help = 'Re-encode and store the answer vectors of every user with answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        schema = get_schema()
+        batch_size = options['batch_size']
+        user_ids = list(
+            UserAnswer.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+        for start in range(0, len(user_ids), batch_size):
+            refresh_user_vectors(user_ids[start:start + batch_size], schema)
+        if settings.MATCHING_SHARED_VECTORS_DIR:
+            # Swap this host's workers over to the rebuilt vectors
+            publish_vectors(schema)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(user_ids)} answer vectors (schema {schema.version})'
+        ))
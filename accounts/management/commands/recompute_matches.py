@@ -0,0 +1,149 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from scipy import sparse
+
+from accounts.matching import (
+    MATCH_THRESHOLD,
+    delete_matches,
+    preference_arrays,
+    preference_mask,
+    write_matches,
+)
+from accounts.models import UserMatch
+from accounts.vectors import ScoringMatrix, get_schema, load_vectors
+
+User = get_user_model()
+
+# Population shared with the worker processes by ``_init_worker``
+_population = {}
+
+
+def _init_worker(scoring, preferences, decided, threshold, limit):
+    _population.update(
+        scoring=scoring, preferences=preferences, decided=decided, threshold=threshold, limit=limit
+    )
+
+
+def _decided_pairs(user_ids):
+    """
+    Symmetric boolean CSR matrix of the population pairs that were already
+    accepted or rejected, indexed by position in ``user_ids``.
+    """
+    order = np.argsort(user_ids)
+    sorted_ids = user_ids[order]
+    pairs = np.array(
+        UserMatch.objects.exclude(status='pending').values_list('user1_id', 'user2_id'), dtype=np.int64
+    ).reshape(-1, 2)
+    positions = np.minimum(np.searchsorted(sorted_ids, pairs), max(len(sorted_ids) - 1, 0))
+    if len(sorted_ids):
+        known = (sorted_ids[positions] == pairs).all(axis=1)
+        rows, columns = order[positions[known, 0]], order[positions[known, 1]]
+    else:
+        rows = columns = np.empty(0, dtype=np.int64)
+    return sparse.csr_matrix(
+        (np.ones(2 * len(rows), dtype=bool), (np.concatenate([rows, columns]), np.concatenate([columns, rows]))),
+        shape=(len(user_ids), len(user_ids)),
+    )
+
+
+def _score_block(start, stop):
+    """
+    Score rows ``start:stop`` against the whole population.
+
+    Returns ``(rows, columns, scores)`` of the qualifying pairs, keeping at
+    most ``limit`` per row like ``generate_matches`` does. Accepted and
+    rejected pairs are left out before the top ``limit`` are taken.
+    """
+    scores = _population['scoring'].block_scores(start, stop)
+    rows = np.arange(start, stop)
+    scores[rows - start, rows] = -1  # never match a user with themselves
+    scores[~preference_mask(_population['preferences'], rows)] = -1
+    scores[_population['decided'][start:stop].nonzero()] = -1
+
+    limit = min(_population['limit'], scores.shape[1])
+    top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    keep = top_scores > _population['threshold']
+    block_rows = np.broadcast_to(rows[:, None], top.shape)
+    return block_rows[keep], top[keep], top_scores[keep]
+
+
+class Command(BaseCommand):
+    help = 'Recompute the matches of the whole verified population'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes scoring blocks in parallel (1 scores in this process)',
+        )
+        parser.add_argument('--block-size', type=int, default=256, help='Users scored per block')
+        parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD)
+        parser.add_argument(
+            '--sparse', action=argparse.BooleanOptionalAction, default=None,
+            help='Force the CSR or dense backend instead of picking one from the choice density',
+        )
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        started = time.perf_counter()
+
+        schema = get_schema()
+        user_ids, matrix = load_vectors(User.objects.filter(email_verified=True), schema)
+        # Stored vectors are already weighted and normalized; drop empty ones
+        usable = matrix.any(axis=1)
+        user_ids = user_ids[usable]
+        scoring = ScoringMatrix(matrix[usable], schema, use_sparse=options['sparse'])
+        del matrix
+        preferences = preference_arrays(user_ids.tolist())
+        decided = _decided_pairs(user_ids)
+
+        footprint = scoring.memory_footprint()
+        self.stdout.write(
+            f'Loaded {len(user_ids)} vectors in {time.perf_counter() - started:.1f}s '
+            f"using the {'sparse' if scoring.is_sparse else 'dense'} backend "
+            f"(choice density {footprint['choice_density']:.1%}, dense {footprint['dense'] / 2**20:.1f} MiB, "
+            f"sparse {footprint['sparse'] / 2**20:.1f} MiB)"
+        )
+
+        blocks = [
+            (start, min(start + options['block_size'], len(user_ids)))
+            for start in range(0, len(user_ids), options['block_size'])
+        ]
+        init_args = (scoring, preferences, decided, options['threshold'], settings.MATCHING_MAX_MATCHES)
+
+        written = 0
+        scoring_started = time.perf_counter()
+        if options['workers'] > 1:
+            with ProcessPoolExecutor(options['workers'], initializer=_init_worker, initargs=init_args) as pool:
+                futures = [pool.submit(_score_block, start, stop) for start, stop in blocks]
+                for future in futures:
+                    written += self._write_block(user_ids, *future.result())
+        else:
+            _init_worker(*init_args)
+            for start, stop in blocks:
+                written += self._write_block(user_ids, *_score_block(start, stop))
+        elapsed = time.perf_counter() - scoring_started
+
+        # Pending matches this run did not refresh no longer qualify
+        pruned = delete_matches(UserMatch.objects.filter(status='pending', updated_at__lt=started_at))
+
+        compared = len(user_ids) * (len(user_ids) - 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {compared} pairs in {elapsed:.1f}s ({compared / max(elapsed, 1e-9):.0f} pairs/s), '
+            f'upserted {written} match rows, pruned {pruned} stale pending matches'
+        ))
+
+    def _write_block(self, user_ids, rows, columns, scores):
+        pairs = {}
+        for first, second, score in zip(user_ids[rows].tolist(), user_ids[columns].tolist(), scores.tolist()):
+            # Both directions of a pair can land in one block with the same
+            # score; the first one seen initiates it
+            pairs.setdefault((min(first, second), max(first, second)), (first, second, score))
+        return write_matches(pairs.values())
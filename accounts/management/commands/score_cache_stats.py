@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts.score_cache import score_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit rate of the pairwise score cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after reading them')
+
+    def handle(self, *args, **options):
+        stats = score_cache_stats(reset=options['reset'])
+        self.stdout.write(
+            f"{stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.1%}"
+        )
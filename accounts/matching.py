@@ -0,0 +1,529 @@
+"""
+Vectorized matching engine.
+
+Stored answer vectors for the requesting user and every candidate are read
+from the vector store in one bulk fetch, stacked into one matrix and scored
+with a single normalized matrix-vector product instead of one cosine call
+per candidate.
+
+When ``MATCHING_ANN_MIN_POPULATION`` is set and the verified population
+reaches it, each worker keeps a ``RandomProjectionIndex`` over it and only
+the candidates it returns are scored. Otherwise candidates are scored
+against the population matrix shared by every worker on the host (see
+``accounts.shared_vectors``) when one is published.
+"""
+import itertools
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .ann import RandomProjectionIndex
+from .models import DirtyMatchUser, Profile, UserAnswerVector, UserMatch
+from .score_cache import cache_scores
+from .shared_vectors import get_shared_vectors
+from .vectors import get_schema, load_vectors
+
+User = get_user_model()
+
+# Minimum cosine similarity for two users to be considered a match
+MATCH_THRESHOLD = 0.5
+
+
+class Scores(namedtuple('Scores', ['candidate_ids', 'scores', 'versions', 'user_version'], defaults=[None, None])):
+    """
+    Scores of one user against candidates, as parallel arrays.
+
+    ``versions`` and ``user_version`` are the ``UserAnswerVector.version``
+    of the candidate and user vectors that were scored, or ``None`` when the
+    scores came from the index, whose vectors may predate the store.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+    def select(self, key):
+        """The candidates picked by the mask or positions ``key``."""
+        return self._replace(
+            candidate_ids=self.candidate_ids[key],
+            scores=self.scores[key],
+            versions=None if self.versions is None else self.versions[key],
+        )
+
+
+class MatchingEngine:
+    def __init__(self, threshold=MATCH_THRESHOLD, schema=None, use_index=True):
+        self.threshold = threshold
+        self.schema = schema or get_schema()
+        self.use_index = use_index
+
+    def score(self, user, candidates):
+        """
+        Score ``user`` against every user in ``candidates``.
+
+        Returns ``Scores``. Candidates without answers are left out.
+        """
+        shared = get_shared_vectors(self.schema)
+        if shared is not None:
+            return self.score_shared(user, candidates, shared)
+
+        users = User.objects.filter(Q(pk__in=candidates.values('pk')) | Q(pk=user.pk))
+        user_ids, matrix, versions = load_vectors(users, self.schema, versions=True)
+
+        position = np.flatnonzero(user_ids == user.id)
+        if not position.size:
+            return Scores.empty()
+
+        # Stored vectors are already weighted and normalized. They were just
+        # read as a dense matrix, so a CSR copy would only add work
+        others = user_ids != user.id
+        scores = matrix[others] @ matrix[position[0]]
+        return Scores(user_ids[others], scores, versions[others], str(versions[position[0]]))
+
+    def score_shared(self, user, candidates, shared):
+        """
+        Like ``score`` but reading candidate vectors from the shared mapping.
+
+        Only the candidates' rows of the mapping are scored, through its
+        ``ScoringMatrix``. The user's own vector and the vectors stored
+        since ``shared`` was published are read from the vector store;
+        candidates missing from ``shared`` and unchanged since are left out
+        until the next publish.
+        """
+        user_ids, matrix, user_versions = load_vectors([user.pk], self.schema, versions=True)
+        if not len(user_ids):
+            return Scores.empty()
+        vector = matrix[0]
+
+        candidates = candidates.exclude(pk=user.pk)
+        published_at = datetime.fromtimestamp(shared.published_at, tz=dt_timezone.utc)
+        changed_ids, changed, changed_versions = load_vectors(
+            candidates.filter(answer_vector__updated_at__gte=published_at), self.schema, versions=True
+        )
+        candidate_ids = np.fromiter(candidates.values_list('pk', flat=True), dtype=np.int64)
+        candidate_ids = candidate_ids[~np.isin(candidate_ids, changed_ids)]
+        found, rows = shared.rows(candidate_ids)
+        scores = shared.scoring.take(rows).dot(vector)
+        return Scores(
+            np.concatenate([candidate_ids[found], changed_ids]),
+            np.concatenate([scores, changed @ vector]),
+            np.concatenate([shared.versions[rows], changed_versions]),
+            str(user_versions[0]),
+        )
+
+    def query_index(self, user, candidates, index):
+        """Like ``score`` but only for the above-threshold candidates found by ``index``."""
+        user_ids, matrix = load_vectors([user.pk], self.schema)
+        if not len(user_ids):
+            return Scores.empty()
+
+        found_ids, scores = index.query(matrix[0], self.threshold, exclude=[user.pk])
+        allowed = candidates.filter(pk__in=found_ids.tolist()).values_list('pk', flat=True)
+        keep = np.isin(found_ids, np.fromiter(allowed, dtype=np.int64))
+        return Scores(found_ids[keep], scores[keep])
+
+    def find_scores(self, user, candidates, limit=None):
+        """
+        Return the ``Scores`` above the threshold, best first. With
+        ``limit`` only the top ``limit`` are kept, selected with
+        ``argpartition`` rather than a full sort.
+        """
+        index = get_index(self.schema) if self.use_index else None
+        if index is not None:
+            found = self.query_index(user, candidates, index)
+        else:
+            found = self.score(user, candidates)
+        found = found.select(found.scores > self.threshold)
+
+        if limit is not None and len(found.scores) > limit:
+            found = found.select(np.argpartition(-found.scores, limit - 1)[:limit])
+        return found.select(np.argsort(-found.scores, kind='stable'))
+
+    def find_matches(self, user, candidates, limit=None):
+        """Like ``find_scores`` but as ``[(candidate_id, score), ...]``."""
+        found = self.find_scores(user, candidates, limit)
+        return list(zip(found.candidate_ids.tolist(), found.scores.tolist()))
+
+
+def _years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # February 29th in a non-leap year
+        return today.replace(year=today.year - years, day=28)
+
+
+def _age(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def preference_filter(profile):
+    """
+    Reciprocal ``Profile`` preference filter for candidate users.
+
+    A candidate passes when their gender fits ``profile.looking_for`` and
+    the other way round, and each side's age fits the other's age range.
+    Missing preferences or birth dates do not restrict either side.
+    """
+    today = timezone.localdate()
+    condition = Q()
+
+    if profile.looking_for in ('male', 'female'):
+        condition &= Q(profile__gender=profile.looking_for)
+    accepted = ['both', '']
+    if profile.gender:
+        accepted.append(profile.gender)
+    condition &= Q(profile__looking_for__in=accepted)
+
+    if profile.min_age_preference is not None:
+        condition &= Q(profile__birth_date__isnull=True) | Q(
+            profile__birth_date__lte=_years_ago(today, profile.min_age_preference)
+        )
+    if profile.max_age_preference is not None:
+        condition &= Q(profile__birth_date__isnull=True) | Q(
+            profile__birth_date__gt=_years_ago(today, profile.max_age_preference + 1)
+        )
+
+    if profile.birth_date is not None:
+        age = _age(profile.birth_date, today)
+        condition &= Q(profile__min_age_preference__isnull=True) | Q(profile__min_age_preference__lte=age)
+        condition &= Q(profile__max_age_preference__isnull=True) | Q(profile__max_age_preference__gte=age)
+
+    return condition
+
+
+GENDER_CODES = {'male': 1, 'female': 2, 'other': 4}
+LOOKING_FOR_CODES = {'male': 1, 'female': 2, 'both': 3}
+
+
+def preference_arrays(user_ids):
+    """
+    Load the matching preferences of ``user_ids`` as parallel arrays, for
+    applying ``preference_filter`` to a whole population in NumPy.
+    """
+    today = timezone.localdate()
+    profiles = {
+        user_id: row
+        for user_id, *row in Profile.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'gender', 'looking_for', 'birth_date', 'min_age_preference', 'max_age_preference'
+        )
+    }
+    count = len(user_ids)
+    arrays = {
+        'gender': np.zeros(count, dtype=np.int8),
+        'looking_for': np.zeros(count, dtype=np.int8),
+        'age': np.full(count, np.nan),
+        'min_age': np.full(count, np.nan),
+        'max_age': np.full(count, np.nan),
+    }
+    for i, user_id in enumerate(user_ids):
+        if user_id not in profiles:
+            continue
+        gender, looking_for, birth_date, min_age, max_age = profiles[user_id]
+        arrays['gender'][i] = GENDER_CODES.get(gender, 0)
+        arrays['looking_for'][i] = LOOKING_FOR_CODES.get(looking_for, 0)
+        if birth_date is not None:
+            arrays['age'][i] = _age(birth_date, today)
+        if min_age is not None:
+            arrays['min_age'][i] = min_age
+        if max_age is not None:
+            arrays['max_age'][i] = max_age
+    return arrays
+
+
+def preference_mask(arrays, rows):
+    """
+    Boolean ``(len(rows), population)`` mask of the pairs that pass the
+    reciprocal ``preference_filter``, for the users at positions ``rows``.
+    """
+    def fits(chooser, chosen):
+        # ``chosen`` fits the gender and age preferences of ``chooser``
+        looking_for = chooser['looking_for']
+        gender_ok = ((looking_for != 1) & (looking_for != 2)) | (chosen['gender'] == looking_for)
+        age = chosen['age']
+        with np.errstate(invalid='ignore'):
+            age_ok = np.isnan(age) | (
+                (np.isnan(chooser['min_age']) | (age >= chooser['min_age']))
+                & (np.isnan(chooser['max_age']) | (age <= chooser['max_age']))
+            )
+        return gender_ok & age_ok
+
+    block = {name: values[rows, None] for name, values in arrays.items()}
+    population = {name: values[None, :] for name, values in arrays.items()}
+    return fits(block, population) & fits(population, block)
+
+
+def match_candidates(user):
+    """
+    Verified users whose preferences fit ``user``'s and who have no
+    accepted or rejected match with them. Pending matches stay candidates
+    so their scores can be refreshed.
+    """
+    # Pairs are stored lower id first, so each branch is a unique index probe
+    decided = UserMatch.objects.exclude(status='pending').filter(
+        Q(user1=user, user2=OuterRef('pk')) | Q(user1=OuterRef('pk'), user2=user)
+    )
+    return User.objects.filter(
+        preference_filter(user.profile),
+        ~Exists(decided),
+        email_verified=True  # Only match with verified users
+    ).exclude(
+        id=user.id
+    )
+
+
+def write_matches(pairs, batch_size=1000):
+    """
+    Upsert ``(initiator_id, other_id, score)`` pairs into ``UserMatch``.
+
+    Pairs are stored lower user id first. New pairs are inserted as pending
+    with ``initiator_id`` as their initiator. Pairs that already exist only
+    get their score refreshed while still pending; accepted and rejected
+    matches are left untouched. Each batch is a single statement. Returns
+    the number of rows inserted or updated.
+    """
+    table = connection.ops.quote_name(UserMatch._meta.db_table)
+    pending = UserMatch._meta.get_field('status').default
+    written = 0
+    pairs = iter(pairs)
+    while True:
+        batch = list(itertools.islice(pairs, batch_size))
+        if not batch:
+            return written
+
+        now = timezone.now()
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+        params = []
+        for initiator_id, other_id, score in batch:
+            params.extend([
+                min(initiator_id, other_id), max(initiator_id, other_id), initiator_id,
+                float(score), pending, now, now,
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user1_id, user2_id, initiator_id, compatibility_score, status, created_at, updated_at) '
+                f'VALUES {placeholders} '
+                f'ON CONFLICT (user1_id, user2_id) DO UPDATE SET '
+                f'compatibility_score = EXCLUDED.compatibility_score, updated_at = EXCLUDED.updated_at '
+                f'WHERE {table}.status = %s',
+                params + [pending],
+            )
+            written += cursor.rowcount
+
+
+def generate_matches(user, engine=None):
+    """
+    Re-score ``user`` against their candidates and upsert their best
+    ``MATCHING_MAX_MATCHES`` pairs, also caching their scores. Returns the
+    number of matches written.
+
+    Pending matches with users who no longer pass the candidate filters are
+    removed, whoever initiated them. Every other pending match this run did
+    not find is re-scored exactly, as the index may have missed it. Those
+    ``user`` initiated are removed once at or below the threshold or outside
+    the top ``MATCHING_MAX_MATCHES``; those the other user initiated only
+    get their score refreshed.
+    """
+    engine = engine or MatchingEngine()
+    limit = settings.MATCHING_MAX_MATCHES
+    candidates = match_candidates(user)
+    scored = engine.find_scores(user, candidates, limit=limit)
+    cache_scores(user.pk, scored)
+    found = dict(zip(scored.candidate_ids.tolist(), scored.scores.tolist()))
+
+    pending = UserMatch.objects.filter(Q(user1=user) | Q(user2=user), status='pending')
+    pending.filter(
+        Q(user1=user) & ~Q(user2__in=candidates) | Q(user2=user) & ~Q(user1__in=candidates)
+    ).delete()
+
+    # other user id -> initiator id of every remaining pending match
+    initiators = {
+        user2_id if user1_id == user.pk else user1_id: initiator_id
+        for user1_id, user2_id, initiator_id in pending.values_list('user1_id', 'user2_id', 'initiator_id')
+    }
+    scores = dict(found)
+    missed = [other_id for other_id in initiators if other_id not in found]
+    if missed:
+        rescored = engine.score(user, User.objects.filter(pk__in=missed))
+        scores.update(zip(rescored.candidate_ids.tolist(), rescored.scores.tolist()))
+        for other_id in missed:
+            if initiators[other_id] == user.pk and scores.get(other_id, 0.0) > engine.threshold:
+                found[other_id] = scores[other_id]
+        if len(found) > limit:
+            found = dict(sorted(found.items(), key=lambda item: -item[1])[:limit])
+
+    dropped = [
+        other_id for other_id, initiator_id in initiators.items()
+        if initiator_id == user.pk and other_id not in found
+    ]
+    if dropped:
+        pending.filter(Q(user1_id__in=dropped) | Q(user2_id__in=dropped)).delete()
+    # Users who no longer have answers share nothing with ``user``
+    refreshed = [
+        (other_id, user.pk, scores.get(other_id, 0.0))
+        for other_id, initiator_id in initiators.items()
+        if initiator_id != user.pk and other_id not in found
+    ]
+    return write_matches(itertools.chain(
+        ((user.pk, candidate_id, similarity) for candidate_id, similarity in found.items()),
+        refreshed,
+    ))
+
+
+def mark_dirty(user_ids):
+    """
+    Queue ``user_ids`` for re-scoring by ``drain_dirty``. Users already
+    queued get a new ``marked_at``, so a drain in progress keeps them.
+    """
+    DirtyMatchUser.objects.bulk_create(
+        [DirtyMatchUser(user_id=user_id) for user_id in user_ids],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['marked_at'],
+    )
+
+
+def drain_dirty(batch_size=100):
+    """
+    Re-score every queued user, each in its own transaction.
+
+    A user is claimed with ``SKIP LOCKED`` so several workers can drain the
+    queue concurrently, and their queue row is only removed if it was not
+    marked again while they were re-scored. Returns the number of users
+    processed.
+    """
+    engine = MatchingEngine()
+    processed = 0
+    while True:
+        user_ids = list(
+            DirtyMatchUser.objects.order_by('marked_at').values_list('user_id', flat=True)[:batch_size]
+        )
+        if engine.use_index and get_index(engine.schema) is not None:
+            refresh_index(user_ids)
+        claimed = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                marked_at = DirtyMatchUser.objects.select_for_update(skip_locked=True).filter(
+                    user_id=user_id
+                ).values_list('marked_at', flat=True).first()
+                if marked_at is None:
+                    # Drained meanwhile or claimed by another worker
+                    continue
+                user = User.objects.select_related('profile').get(pk=user_id)
+                if user.email_verified:
+                    generate_matches(user, engine)
+                else:
+                    UserMatch.objects.filter(Q(user1=user) | Q(user2=user), status='pending').delete()
+                DirtyMatchUser.objects.filter(user_id=user_id, marked_at__lte=marked_at).delete()
+            claimed += 1
+        if not claimed:
+            return processed
+        processed += claimed
+
+
+def delete_matches(matches, chunk_size=1000, pause=0):
+    """
+    Delete the ``matches`` queryset ``chunk_size`` rows at a time, oldest
+    first, each chunk in its own short transaction so no lock is held across
+    the run; ``pause`` seconds between chunks leave room for other writers.
+    Returns the number of matches deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(matches.order_by('updated_at').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            # Re-apply the filter: a match may have been answered meanwhile
+            count, _ = matches.filter(id__in=ids).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def prune_matches(pending_days=None, rejected_days=None, chunk_size=1000, pause=0):
+    """
+    Delete rejected matches and pending matches that were not refreshed
+    within their retention period (``MATCHING_REJECTED_RETENTION_DAYS`` and
+    ``MATCHING_PENDING_RETENTION_DAYS`` by default), in chunks with
+    ``delete_matches``. Returns the number of matches deleted per status.
+    """
+    now = timezone.now()
+    retention = {
+        'pending': settings.MATCHING_PENDING_RETENTION_DAYS if pending_days is None else pending_days,
+        'rejected': settings.MATCHING_REJECTED_RETENTION_DAYS if rejected_days is None else rejected_days,
+    }
+    return {
+        status: delete_matches(
+            UserMatch.objects.filter(status=status, updated_at__lt=now - timedelta(days=days)),
+            chunk_size,
+            pause,
+        )
+        for status, days in retention.items()
+    }
+
+
+_index = None
+_index_version = None
+_index_built_at = None
+
+
+def get_index(schema):
+    """
+    Return this process's index over the verified population.
+
+    Returns ``None`` when ``MATCHING_ANN_MIN_POPULATION`` is 0 or the
+    population is below it. The index is rebuilt from the vector
+    store after a schema or weights change or every
+    ``MATCHING_ANN_REBUILD_SECONDS`` to pick up edits made in other processes.
+    """
+    global _index, _index_version, _index_built_at
+    if not settings.MATCHING_ANN_MIN_POPULATION:
+        return None
+    now = time.monotonic()
+    version = (schema.version, schema.weights_version)
+    if (
+        _index_version == version
+        and now - _index_built_at < settings.MATCHING_ANN_REBUILD_SECONDS
+    ):
+        return _index
+
+    population = User.objects.filter(email_verified=True)
+    if UserAnswerVector.objects.filter(user__in=population).count() < settings.MATCHING_ANN_MIN_POPULATION:
+        _index = None
+    else:
+        user_ids, matrix = load_vectors(population, schema)
+        _index = RandomProjectionIndex.build(
+            user_ids,
+            matrix,
+            n_tables=settings.MATCHING_ANN_TABLES,
+            n_bits=settings.MATCHING_ANN_BITS,
+        )
+    _index_version = version
+    _index_built_at = now
+    return _index
+
+
+def refresh_index(user_ids):
+    """
+    Apply the stored vectors of ``user_ids`` to this process's index,
+    dropping those who are unverified or have no answers. ``drain_dirty``
+    calls it for the users it drains, in the workers that query the index;
+    other changes are picked up by the periodic rebuild.
+    """
+    if _index is None:
+        return
+    user_ids = list(user_ids)
+    encoded_ids, matrix = load_vectors(User.objects.filter(pk__in=user_ids, email_verified=True), get_schema())
+    _index.remove(user_ids)
+    _index.add(encoded_ids, matrix)
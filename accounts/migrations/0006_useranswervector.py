@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 15:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_user_first_name_alter_user_last_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAnswerVector',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='answer_vector', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('schema_version', models.CharField(max_length=32)),
+                ('vector', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
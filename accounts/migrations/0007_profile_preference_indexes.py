@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_useranswervector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'looking_for'], name='accounts_pr_gender_78a257_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['birth_date'], name='accounts_pr_birth_d_002f13_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['min_age_preference', 'max_age_preference'], name='accounts_pr_min_age_167a19_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_profile_preference_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyMatchUser',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_dirtymatchuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswervector',
+            name='normalized',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='useranswervector',
+            name='weights_version',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
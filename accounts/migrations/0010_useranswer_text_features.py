@@ -0,0 +1,52 @@
+# Generated by Django 5.0 on 2026-10-18 16:20
+
+import numpy as np
+from django.db import migrations, models
+from sklearn.feature_extraction.text import HashingVectorizer
+
+
+# Frozen copy of accounts.text_features.featurize as of this migration
+_vectorizer = HashingVectorizer(
+    n_features=256,
+    ngram_range=(1, 2),
+    stop_words='english',
+    alternate_sign=False,
+    norm=None,
+)
+
+
+def featurize(text):
+    counts = _vectorizer.transform([text]).toarray()[0].astype(np.float32)
+    np.log1p(counts, out=counts)
+    norm = np.linalg.norm(counts)
+    return counts / norm if norm > 0 else counts
+
+
+def featurize_text_answers(apps, schema_editor):
+    UserAnswer = apps.get_model('accounts', 'UserAnswer')
+    answers = UserAnswer.objects.exclude(text_answer='').only('id', 'text_answer')
+    batch = []
+    for answer in answers.iterator(chunk_size=2000):
+        if answer.text_answer.strip():
+            answer.text_features = featurize(answer.text_answer).tobytes()
+            batch.append(answer)
+        if len(batch) == 2000:
+            UserAnswer.objects.bulk_update(batch, ['text_features'])
+            batch = []
+    UserAnswer.objects.bulk_update(batch, ['text_features'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_useranswervector_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='text_features',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(featurize_text_answers, migrations.RunPython.noop),
+    ]
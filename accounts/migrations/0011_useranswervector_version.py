@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-18 16:35
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_vector_versions(apps, schema_editor):
+    UserAnswerVector = apps.get_model('accounts', 'UserAnswerVector')
+    vectors = UserAnswerVector.objects.only('user_id', 'normalized')
+    batch = []
+    for vector in vectors.iterator(chunk_size=2000):
+        vector.version = hashlib.sha1(bytes(vector.normalized)).hexdigest()[:16]
+        batch.append(vector)
+        if len(batch) == 2000:
+            UserAnswerVector.objects.bulk_update(batch, ['version'])
+            batch = []
+    UserAnswerVector.objects.bulk_update(batch, ['version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_useranswer_text_features'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswervector',
+            name='version',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.RunPython(fill_vector_versions, migrations.RunPython.noop),
+    ]
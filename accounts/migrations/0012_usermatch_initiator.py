@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-18 16:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef
+
+
+def canonicalize_matches(apps, schema_editor):
+    UserMatch = apps.get_model('accounts', 'UserMatch')
+    UserMatch.objects.update(initiator=F('user1'))
+
+    # Of a pair stored in both orders keep the decided row, then the newest
+    reversed_twin = UserMatch.objects.filter(user1=OuterRef('user2'), user2=OuterRef('user1'))
+    duplicated = list(UserMatch.objects.filter(Exists(reversed_twin)).values_list(
+        'id', 'user1_id', 'user2_id', 'status', 'updated_at'
+    ))
+    best = {}
+    for match_id, user1_id, user2_id, status, updated_at in duplicated:
+        pair = (min(user1_id, user2_id), max(user1_id, user2_id))
+        rank = (status != 'pending', updated_at, match_id)
+        best[pair] = max(best.get(pair, rank), rank)
+    kept = {rank[2] for rank in best.values()}
+    UserMatch.objects.filter(id__in=[row[0] for row in duplicated if row[0] not in kept]).delete()
+
+    UserMatch.objects.filter(user1__gt=F('user2')).update(user1=F('user2'), user2=F('user1'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_useranswervector_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermatch',
+            name='initiator',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(canonicalize_matches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 16:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_usermatch_initiator'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usermatch',
+            name='initiator',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='usermatch',
+            index=models.Index(fields=['user2', 'status'], name='accounts_us_user2_i_fd4105_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usermatch',
+            constraint=models.CheckConstraint(check=models.Q(('user1__lt', models.F('user2'))), name='usermatch_canonical_pair'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_usermatch_canonical_pair'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermatch',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['updated_at'], name='usermatch_pending_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='usermatch',
+            index=models.Index(condition=models.Q(('status', 'rejected')), fields=['updated_at'], name='usermatch_rejected_updated'),
+        ),
+    ]
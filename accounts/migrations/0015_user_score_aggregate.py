@@ -0,0 +1,51 @@
+# Generated by Django 5.0 on 2026-10-18 17:20
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_scores(apps, schema_editor):
+    QuestionChoice = apps.get_model('accounts', 'QuestionChoice')
+    User = apps.get_model('accounts', 'User')
+    UserAnswer = apps.get_model('accounts', 'UserAnswer')
+
+    first_scale_value = QuestionChoice.objects.filter(
+        user_answers=OuterRef('pk'), question__question_type='scale'
+    ).order_by('order').values('value')[:1]
+    UserAnswer.objects.update(
+        score_value=Coalesce(Cast(Subquery(first_scale_value), FloatField()), Value(0.0))
+    )
+
+    answers = UserAnswer.objects.filter(user=OuterRef('pk')).order_by().values('user')
+    User.objects.update(
+        score_sum=Coalesce(Subquery(answers.annotate(total=Sum('score_value')).values('total')), Value(0.0)),
+        score_count=Coalesce(Subquery(answers.annotate(total=Count('id')).values('total')), Value(0)),
+    )
+    User.objects.filter(score_count__gt=0).update(matching_score=F('score_sum') / F('score_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_usermatch_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='score_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='score_sum',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='useranswer',
+            name='score_value',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
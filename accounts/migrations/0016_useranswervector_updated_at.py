@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_user_score_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useranswervector',
+            index=models.Index(fields=['updated_at'], name='accounts_us_updated_653761_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-18 18:50
+
+import numpy as np
+from django.core.cache import cache
+from django.db import migrations, models
+
+
+def store_cached_idf(apps, schema_editor):
+    # Keep the IDF fitted before this migration, if the cache still has it
+    idf = cache.get('accounts:text_idf')
+    if idf is not None:
+        TextIdf = apps.get_model('accounts', 'TextIdf')
+        TextIdf.objects.create(pk=1, idf=np.asarray(idf, dtype=np.float32).tobytes())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_useranswervector_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextIdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idf', models.BinaryField()),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(store_cached_idf, migrations.RunPython.noop),
+    ]
@@ -31,6 +31,9 @@ class User(AbstractUser):
     email_verification_token = models.CharField(max_length=100, blank=True)
     matching_score = models.FloatField(null=False, default=0.0)
     last_score_update = models.DateTimeField(null=True, blank=True)
+    # Running aggregate of UserAnswer.score_value, see accounts.scores
+    score_sum = models.FloatField(default=0.0, editable=False)
+    score_count = models.PositiveIntegerField(default=0, editable=False)
     first_name = models.CharField(max_length=255, blank=True, null=True)
     last_name = models.CharField(max_length=255, blank=True, null=True)
     
@@ -65,6 +68,14 @@ class Profile(models.Model):
     min_age_preference = models.IntegerField(null=True, blank=True)
     max_age_preference = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        # Support the reciprocal candidate filter in accounts.matching
+        indexes = [
+            models.Index(fields=['gender', 'looking_for']),
+            models.Index(fields=['birth_date']),
+            models.Index(fields=['min_age_preference', 'max_age_preference']),
+        ]
+
     def __str__(self):
         return f"Profile of {self.user.email}"
 
@@ -130,6 +141,10 @@ class UserAnswer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_choices = models.ManyToManyField(QuestionChoice, blank=True, related_name='user_answers')
     text_answer = models.TextField(blank=True)
+    # Hashed term frequencies of text_answer, see accounts.text_features
+    text_features = models.BinaryField(default=b'', editable=False)
+    # Contribution to User.matching_score: the chosen value of a scale question
+    score_value = models.FloatField(default=0.0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -139,9 +154,21 @@ class UserAnswer(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.question.text[:30]}"
 
+    def save(self, *args, **kwargs):
+        from .text_features import featurize
+
+        self.text_features = featurize(self.text_answer).tobytes() if self.text_answer.strip() else b''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text_answer' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'text_features'}
+        super().save(*args, **kwargs)
+
 class UserMatch(models.Model):
+    # Each pair is stored once, lower user id first; ``initiator`` is the
+    # user whose matching run created it
     user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_user1')
     user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_user2')
+    initiator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
     compatibility_score = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -153,6 +180,54 @@ class UserMatch(models.Model):
 
     class Meta:
         unique_together = ['user1', 'user2']
+        constraints = [
+            models.CheckConstraint(check=models.Q(user1__lt=models.F('user2')), name='usermatch_canonical_pair'),
+        ]
+        indexes = [
+            # ``user1`` lookups are served by the unique pair index
+            models.Index(fields=['user2', 'status']),
+            # Retention scans only touch the rows they can delete
+            models.Index(fields=['updated_at'], name='usermatch_pending_updated', condition=models.Q(status='pending')),
+            models.Index(fields=['updated_at'], name='usermatch_rejected_updated', condition=models.Q(status='rejected')),
+        ]
 
     def __str__(self):
         return f"{self.user1.email} - {self.user2.email} ({self.compatibility_score})"
+
+    def other_user(self, user):
+        return self.user2 if self.user1_id == user.pk else self.user1
+
+class UserAnswerVector(models.Model):
+    """Materialized answer vector of a user, encoded with ``accounts.vectors.VectorSchema``."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='answer_vector')
+    schema_version = models.CharField(max_length=32)
+    vector = models.BinaryField()
+    # Category-weighted, unit-length form of ``vector`` used for scoring
+    weights_version = models.CharField(max_length=32, blank=True)
+    normalized = models.BinaryField(default=b'')
+    # Digest of ``normalized``; changes whenever the scored vector does
+    version = models.CharField(max_length=16, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Finds the vectors stored since the shared matrix was published
+        indexes = [models.Index(fields=['updated_at'])]
+
+    def __str__(self):
+        return f"Answer vector of {self.user_id} ({self.schema_version})"
+
+class DirtyMatchUser(models.Model):
+    """User whose matches need re-scoring after their answers changed."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dirty matches of {self.user_id}"
+
+class TextIdf(models.Model):
+    """Fitted short answer IDF, the durable copy of the one cached by ``accounts.text_features``."""
+    idf = models.BinaryField()
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Text IDF fitted at {self.fitted_at}"
@@ -0,0 +1,86 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ScoreCursorPagination(BasePagination):
+    """
+    Keyset pagination over ``UserMatch`` ordered by best score first.
+
+    The cursor encodes the ``(compatibility_score, id)`` of the last row of
+    the previous page, so deep pages do not read and skip the earlier rows
+    the way an offset does. Rows are found through the pair and
+    ``(user2, status)`` indexes and sorted per request, which stays cheap
+    as a user keeps a bounded number of matches per status.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-compatibility_score', '-id')
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            score, pk = cursor
+            queryset = queryset.filter(
+                Q(compatibility_score__lt=score) | Q(compatibility_score=score, id__lt=pk)
+            )
+
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = (page[-1].compatibility_score, page[-1].id) if self.has_next else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            score, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            return float(score), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        score, pk = cursor
+        return base64.urlsafe_b64encode(f'{score!r}:{pk}'.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        url = self.request.build_absolute_uri()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_cursor))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
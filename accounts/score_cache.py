@@ -0,0 +1,110 @@
+"""
+Cache of pairwise compatibility scores.
+
+A key holds the unordered user pair and the vector version of both users
+(see ``UserAnswerVector.version``), so both directions of a pair share one
+entry and re-encoding or re-weighting either vector moves the pair to a new
+key. Outdated entries are never read again and expire after
+``MATCHING_SCORE_CACHE_SECONDS``.
+
+The matcher fills the cache with the scores it keeps, keyed by the versions
+of the vectors it actually scored; scores from the index are not cached.
+``get_pair_score`` reads through it and counts hits and misses for
+``score_cache_stats``. Counts are kept per process and added to the shared
+ones every ``STATS_FLUSH_EVERY`` lookups, off the lookup's own round trips.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserAnswerVector
+from .vectors import load_vectors, vector_version
+
+SCORE_KEY_PREFIX = 'accounts:pair_score'
+HITS_KEY = 'accounts:pair_score_stats:hits'
+MISSES_KEY = 'accounts:pair_score_stats:misses'
+STATS_FLUSH_EVERY = 100
+
+# Lookups counted by this process since its last flush
+_counts = {HITS_KEY: 0, MISSES_KEY: 0}
+
+
+def pair_key(user_id, other_id, versions):
+    """Key of the pair's score, given a mapping of both users' vector versions."""
+    low, high = sorted((user_id, other_id))
+    return f'{SCORE_KEY_PREFIX}:{low}:{high}:{versions[low]}:{versions[high]}'
+
+
+def _versions(user_ids):
+    return dict(UserAnswerVector.objects.filter(user_id__in=user_ids).values_list('user_id', 'version'))
+
+
+def cache_scores(user_id, scored):
+    """Store the ``accounts.matching.Scores`` of ``user_id`` whose vector versions are known."""
+    if scored.versions is None or scored.user_version is None:
+        return
+    cache.set_many(
+        {
+            pair_key(user_id, other_id, {user_id: scored.user_version, other_id: version}): score
+            for other_id, score, version in zip(
+                scored.candidate_ids.tolist(), scored.scores.tolist(), scored.versions.tolist()
+            )
+        },
+        settings.MATCHING_SCORE_CACHE_SECONDS,
+    )
+
+
+def flush_stats():
+    """Add this process's pending hit and miss counts to the shared ones."""
+    for key, count in _counts.items():
+        if not count:
+            continue
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+        _counts[key] = 0
+
+
+def _count(key):
+    _counts[key] += 1
+    if sum(_counts.values()) >= STATS_FLUSH_EVERY:
+        flush_stats()
+
+
+def get_pair_score(user_id, other_id, schema=None):
+    """
+    Return the compatibility score of two users, or ``None`` when either
+    has no answer vector. Misses are scored from the vector store.
+    """
+    versions = _versions([user_id, other_id])
+    if len(versions) < 2:
+        return None
+    score = cache.get(pair_key(user_id, other_id, versions))
+    if score is not None:
+        _count(HITS_KEY)
+        return score
+
+    _count(MISSES_KEY)
+    user_ids, matrix = load_vectors([user_id, other_id], schema)
+    if len(user_ids) < 2:
+        return None
+    score = float(matrix[0] @ matrix[1])
+    # Loading may have re-encoded a stale vector, so key by what was scored
+    versions = {pair_user_id: vector_version(row) for pair_user_id, row in zip(user_ids.tolist(), matrix)}
+    cache.set(pair_key(user_id, other_id, versions), score, settings.MATCHING_SCORE_CACHE_SECONDS)
+    return score
+
+
+def score_cache_stats(reset=False):
+    """
+    Return the hit and miss counts and the hit rate since the last reset.
+
+    Other processes' latest lookups show up once they flush them.
+    """
+    flush_stats()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    if reset:
+        cache.delete_many([HITS_KEY, MISSES_KEY])
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else 0.0}
@@ -0,0 +1,88 @@
+"""
+Running ``User.matching_score`` aggregate.
+
+Every answer stores its own ``score_value`` and the user keeps the sum and
+count of them, ``matching_score`` being their mean. Changes are applied as
+deltas with ``F()`` expressions in a single UPDATE, so no answer is re-read
+and concurrent changes cannot overwrite each other. Bulk writes, which do not
+know which answers existed before, recompute the aggregate instead.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import QuestionChoice, User, UserAnswer
+
+
+def answer_score_value(answer_id):
+    """The first chosen value of a scale question answer, 0 for other answers."""
+    value = QuestionChoice.objects.filter(
+        user_answers=answer_id, question__question_type='scale'
+    ).order_by('order').values_list('value', flat=True).first()
+    return float(value or 0)
+
+
+def apply_score_delta(user_id, sum_delta, count_delta):
+    """Add to a user's running aggregate and refresh ``matching_score``."""
+    score_sum = F('score_sum') + sum_delta
+    score_count = F('score_count') + count_delta
+    User.objects.filter(pk=user_id).update(
+        score_sum=score_sum,
+        score_count=score_count,
+        matching_score=Case(
+            When(Q(score_count__gt=-count_delta), then=score_sum / score_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        last_score_update=timezone.now(),
+    )
+
+
+def uncount_question_scores(question_id):
+    """
+    Remove the answers to a question from their users' aggregates, in one
+    UPDATE. Each user has at most one answer per question.
+    """
+    answers = UserAnswer.objects.filter(question_id=question_id)
+    score_value = Subquery(answers.filter(user=OuterRef('pk')).values('score_value')[:1])
+    score_sum = F('score_sum') - score_value
+    score_count = F('score_count') - 1
+    User.objects.filter(pk__in=answers.values('user_id')).update(
+        score_sum=score_sum,
+        score_count=score_count,
+        matching_score=Case(
+            When(Q(score_count__gt=1), then=score_sum / score_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        last_score_update=timezone.now(),
+    )
+
+
+def recompute_score(user_id):
+    """
+    Recompute a user's aggregate from all of their answers. Run it in a
+    transaction: the user row is locked first, so the sum covers every
+    answer committed before it and concurrent writers queue behind it.
+    """
+    User.objects.select_for_update().filter(pk=user_id).values_list('pk').first()
+    totals = UserAnswer.objects.filter(user_id=user_id).aggregate(
+        score_sum=Coalesce(Sum('score_value'), 0.0), score_count=Count('pk')
+    )
+    User.objects.filter(pk=user_id).update(
+        matching_score=totals['score_sum'] / totals['score_count'] if totals['score_count'] else 0.0,
+        last_score_update=timezone.now(),
+        **totals,
+    )
+
+
+def refresh_answer_scores(answer_ids):
+    """Re-derive the ``score_value`` of answers whose choices changed."""
+    with transaction.atomic():
+        answers = UserAnswer.objects.select_for_update().filter(pk__in=answer_ids)
+        for answer_id, user_id, old_value in answers.values_list('id', 'user_id', 'score_value'):
+            value = answer_score_value(answer_id)
+            if value != old_value:
+                UserAnswer.objects.filter(pk=answer_id).update(score_value=value)
+                apply_score_delta(user_id, value - old_value, 0)
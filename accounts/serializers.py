@@ -2,6 +2,7 @@
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import (
@@ -12,6 +13,9 @@ from .models import (
     UserAnswer,
     UserMatch
 )
+from .scores import recompute_score
+from .signals import refresh_vectors_on_commit
+from .text_features import featurize_many
 from google.oauth2 import id_token
 import requests
 import random
@@ -238,6 +242,107 @@ class UserAnswerSerializer(serializers.ModelSerializer):
         return instance
 
 
+class CategoryAnswerSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    selected_choice_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list
+    )
+    text_answer = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        # Same rules as UserAnswerSerializer, checked against the category's
+        # questions and choices loaded once by BulkCategoryAnswerSerializer
+        question = self.context['questions'].get(data['question'])
+        if question is None:
+            raise serializers.ValidationError("Question does not belong to this category")
+        selected_choice_ids = data['selected_choice_ids']
+
+        if question.question_type in ['single_choice', 'multiple_choice']:
+            if not selected_choice_ids and question.required:
+                raise serializers.ValidationError("This question requires at least one choice selection")
+            if question.question_type == 'single_choice' and len(selected_choice_ids) > 1:
+                raise serializers.ValidationError("This question only allows one choice")
+        elif question.question_type == 'short_answer':
+            if question.required and not data['text_answer']:
+                raise serializers.ValidationError("This question requires a text answer")
+
+        if not set(selected_choice_ids) <= question.choice_values.keys():
+            raise serializers.ValidationError("Invalid choice selection")
+        data['question'] = question
+        return data
+
+
+class BulkCategoryAnswerSerializer(serializers.Serializer):
+    """
+    All answers of one user to the questions of one ``QuestionCategory``.
+
+    Answers are upserted and their choices replaced with a handful of bulk
+    statements; the score aggregate and answer vector are refreshed once.
+    """
+    answers = CategoryAnswerSerializer(many=True, allow_empty=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        questions = self.context['category'].questions.prefetch_related('choices')
+        self.context['questions'] = {question.pk: question for question in questions}
+        for question in self.context['questions'].values():
+            # choice id -> value, in choice order
+            question.choice_values = {choice.pk: choice.value for choice in question.choices.all()}
+
+    def validate_answers(self, answers):
+        question_ids = [answer['question'].pk for answer in answers]
+        if len(set(question_ids)) != len(question_ids):
+            raise serializers.ValidationError("Each question can only be answered once")
+        return answers
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        answers = validated_data['answers']
+
+        rows = []
+        for answer in answers:
+            question = answer['question']
+            score_value = 0.0
+            if question.question_type == 'scale' and answer['selected_choice_ids']:
+                # The first chosen value in choice order, like accounts.scores
+                chosen = [value for pk, value in question.choice_values.items() if pk in answer['selected_choice_ids']]
+                score_value = float(chosen[0])
+            rows.append(UserAnswer(
+                user=user, question=question, text_answer=answer['text_answer'], score_value=score_value
+            ))
+        # Bulk writes skip UserAnswer.save(), which derives the text features
+        texts = [row for row in rows if row.text_answer.strip()]
+        for row, features in zip(texts, featurize_many([row.text_answer for row in texts])):
+            row.text_features = features.tobytes()
+
+        with transaction.atomic():
+            UserAnswer.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['user', 'question'],
+                update_fields=['text_answer', 'text_features', 'score_value', 'updated_at'],
+            )
+            answer_ids = dict(
+                UserAnswer.objects.filter(
+                    user=user, question__in=[row.question_id for row in rows]
+                ).values_list('question_id', 'id')
+            )
+            through = UserAnswer.selected_choices.through
+            through.objects.filter(useranswer_id__in=[answer_ids[row.question_id] for row in rows]).delete()
+            through.objects.bulk_create([
+                through(useranswer_id=answer_ids[answer['question'].pk], questionchoice_id=choice_id)
+                for answer in answers
+                for choice_id in set(answer['selected_choice_ids'])
+            ])
+            # Which answers existed before is unknown after the upsert
+            recompute_score(user.pk)
+            refresh_vectors_on_commit([user.pk])
+
+        return UserAnswer.objects.filter(pk__in=answer_ids.values()).prefetch_related('selected_choices')
+
+
 class UserMatchSerializer(serializers.ModelSerializer):
     matched_user = serializers.SerializerMethodField()
 
@@ -250,11 +355,7 @@ class UserMatchSerializer(serializers.ModelSerializer):
     def get_matched_user(self, obj):
         request = self.context.get('request')
         if request:
-            if obj.user1 == request.user:
-                matched_user = obj.user2
-            else:
-                matched_user = obj.user1
-            return UserSerializer(matched_user).data
+            return UserSerializer(obj.other_user(request.user)).data
         return None
 
 
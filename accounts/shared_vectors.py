@@ -0,0 +1,201 @@
+"""
+Population answer vectors shared by the worker processes of one host.
+
+Sharing is enabled by setting ``MATCHING_SHARED_VECTORS_DIR``. The verified
+population's normalized vectors are published there as a versioned set of
+``.npy`` files holding the blocks of a ``ScoringMatrix``: the dense single
+value block and the choice block, as CSR arrays when it is sparse. Workers
+open them with ``np.load(mmap_mode='r')``, so the page cache holds a single
+copy of the matrix however many workers score against it.
+
+A version is written to a staging directory and renamed into place before
+the ``CURRENT`` pointer is swapped with ``os.replace``, so readers see either
+the previous or the new version, never a partial one. Every lookup re-reads
+the pointer and remaps when it moved. Older versions are unlinked after a
+swap; mappings still open on them stay valid until their worker moves on.
+
+Versions are only published by the ``publish_shared_vectors`` task, which
+every worker runs when it starts and which is broadcast to every worker
+each ``MATCHING_SHARED_VECTORS_SECONDS``, and by ``rebuild_answer_vectors``.
+Scoring never publishes: workers keep using the last version, and the
+matcher reads the vectors stored since it was published from the vector
+store. A version older than ``MAX_AGE_PERIODS`` periods is no longer used,
+so a host that stopped publishing falls back to the vector store instead
+of leaving out every user who joined since.
+"""
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from scipy import sparse
+
+from .vectors import ScoringMatrix, get_schema, load_vectors
+
+User = get_user_model()
+
+POINTER_NAME = 'CURRENT'
+LOCK_NAME = '.lock'
+STAGING_PREFIX = '.staging-'
+CSR_PARTS = ('data', 'indices', 'indptr')
+# Publish periods after which a version is too old to use
+MAX_AGE_PERIODS = 2
+
+
+class SharedVectors:
+    """Read-only mapping of one published version."""
+
+    def __init__(self, name, user_ids, scoring, versions):
+        self.name = name
+        self.schema_version, self.weights_version, published_ns = name.split('-')
+        # Vectors stored from this moment on may be missing from the version
+        self.published_at = int(published_ns) / 1e9
+        self.user_ids = user_ids
+        self.scoring = scoring
+        # ``UserAnswerVector.version`` of each published row
+        self.versions = versions
+
+    @classmethod
+    def open(cls, directory, name, schema):
+        path = os.path.join(directory, name)
+
+        def load(part):
+            return np.load(os.path.join(path, f'{part}.npy'), mmap_mode='r')
+
+        user_ids = load('user_ids')
+        if os.path.exists(os.path.join(path, 'choices.npy')):
+            choices = load('choices')
+        else:
+            choices = sparse.csr_matrix(
+                tuple(load(f'choices_{part}') for part in CSR_PARTS),
+                shape=(len(user_ids), len(schema.sparse_columns)),
+            )
+        return cls(name, user_ids, ScoringMatrix.from_parts(schema, load('dense'), choices), load('versions'))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def fits(self, schema):
+        return self.schema_version == schema.version and self.weights_version == schema.weights_version
+
+    def rows(self, user_ids):
+        """
+        Return ``(found, rows)``: a mask of the ``user_ids`` present in this
+        version and the matrix rows of those that are.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        rows = np.searchsorted(self.user_ids, user_ids)
+        found = rows < len(self.user_ids)
+        found[found] = self.user_ids[rows[found]] == user_ids[found]
+        return found, rows[found]
+
+
+def _read_pointer(directory):
+    try:
+        with open(os.path.join(directory, POINTER_NAME)) as pointer:
+            return pointer.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(directory, name):
+    descriptor, path = tempfile.mkstemp(prefix=STAGING_PREFIX, dir=directory)
+    with os.fdopen(descriptor, 'w') as pointer:
+        pointer.write(name)
+    os.replace(path, os.path.join(directory, POINTER_NAME))
+
+
+def _is_fresh(name, schema):
+    schema_version, weights_version, published_ns = name.split('-')
+    return (
+        schema_version == schema.version
+        and weights_version == schema.weights_version
+        and time.time() - int(published_ns) / 1e9 < settings.MATCHING_SHARED_VECTORS_SECONDS
+    )
+
+
+def _save(directory, user_ids, scoring, versions):
+    np.save(os.path.join(directory, 'user_ids.npy'), user_ids)
+    np.save(os.path.join(directory, 'versions.npy'), versions)
+    np.save(os.path.join(directory, 'dense.npy'), scoring.dense)
+    if scoring.is_sparse:
+        for part in CSR_PARTS:
+            np.save(os.path.join(directory, f'choices_{part}.npy'), getattr(scoring.choices, part))
+    else:
+        np.save(os.path.join(directory, 'choices.npy'), scoring.choices)
+
+
+def publish_vectors(schema=None, block=True):
+    """
+    Write the verified population's vectors as a new version and point
+    ``CURRENT`` at it.
+
+    One process publishes at a time. With ``block=False`` this returns
+    ``None`` instead of waiting while another process publishes, and skips
+    publishing when a fresh version appeared in the meantime. Returns the
+    name of the current version.
+    """
+    directory = settings.MATCHING_SHARED_VECTORS_DIR
+    schema = schema or get_schema()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_NAME), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return None
+        current = _read_pointer(directory)
+        if not block and current and _is_fresh(current, schema):
+            return current
+
+        # Taken before loading, so vectors stored while loading count as newer
+        name = f'{schema.version}-{schema.weights_version}-{time.time_ns()}'
+        user_ids, matrix, versions = load_vectors(User.objects.filter(email_verified=True), schema, versions=True)
+        order = np.argsort(user_ids)
+        staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=directory)
+        _save(staging, user_ids[order], ScoringMatrix(matrix[order], schema), versions[order])
+        os.rename(staging, os.path.join(directory, name))
+        _write_pointer(directory, name)
+
+        for entry in os.listdir(directory):
+            if entry not in (name, POINTER_NAME, LOCK_NAME):
+                path = os.path.join(directory, entry)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+    return name
+
+
+_shared = None
+
+
+def get_shared_vectors(schema=None):
+    """
+    Return this process's mapping of the current version, or ``None`` when
+    sharing is disabled, nothing was published yet or the published version
+    does not match ``schema`` or is too old.
+    """
+    global _shared
+    directory = settings.MATCHING_SHARED_VECTORS_DIR
+    if not directory:
+        return None
+    schema = schema or get_schema()
+
+    name = _read_pointer(directory)
+    if name is None:
+        return None
+    if _shared is None or _shared.name != name:
+        try:
+            _shared = SharedVectors.open(directory, name, schema)
+        except FileNotFoundError:
+            # Replaced between reading the pointer and opening it
+            pass
+    if _shared is None or not _shared.fits(schema):
+        return None
+    if time.time() - _shared.published_at > MAX_AGE_PERIODS * settings.MATCHING_SHARED_VECTORS_SECONDS:
+        return None
+    return _shared
@@ -0,0 +1,162 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .matching import mark_dirty
+from .models import Question, QuestionCategory, QuestionChoice, User, UserAnswer
+from .scores import apply_score_delta, refresh_answer_scores, uncount_question_scores
+from .tasks import drain_dirty_matches, renormalize_answer_vectors
+from .vectors import invalidate_schema, refresh_user_vectors
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=QuestionChoice)
+def invalidate_vector_schema(sender, **kwargs):
+    invalidate_schema()
+
+
+@receiver([post_save, post_delete], sender=QuestionCategory)
+def reweight_vectors(sender, **kwargs):
+    invalidate_schema()
+    transaction.on_commit(renormalize_answer_vectors.delay, robust=True)
+
+
+# On-commit work below is robust: the data is committed either way, and a
+# failed enqueue is recovered by the periodic drain and sweep
+def _refresh_vectors(user_ids):
+    refresh_user_vectors(user_ids)
+    mark_dirty(user_ids)
+    drain_dirty_matches.delay()
+
+
+def refresh_vectors_on_commit(user_ids):
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _refresh_vectors(user_ids), robust=True)
+
+
+def _mark_dirty(user_ids):
+    mark_dirty(user_ids)
+    drain_dirty_matches.delay()
+
+
+def _origin_model(origin):
+    # ``origin`` is the instance or queryset whose delete() started the deletion
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver([post_save, post_delete], sender=UserAnswer)
+def refresh_answer_vector(sender, instance, origin=None, **kwargs):
+    # A deleted user's vector and dirty mark go with them, and answers of a
+    # deleted question are handled per question by ``mark_question_users``
+    if origin is None or _origin_model(origin) not in (User, Question, QuestionCategory):
+        refresh_vectors_on_commit([instance.user_id])
+
+
+@receiver(pre_delete, sender=Question)
+def mark_question_users(sender, instance, **kwargs):
+    # The schema changes with the question, so stored vectors are re-encoded
+    # when next loaded; only the matches need re-scoring
+    user_ids = list(UserAnswer.objects.filter(question=instance).values_list('user_id', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: _mark_dirty(user_ids), robust=True)
+
+
+@receiver(m2m_changed, sender=UserAnswer.selected_choices.through)
+def remember_cleared_answers(sender, instance, action, reverse, **kwargs):
+    # A reverse clear reports no pk_set, so note the answers it touches
+    if reverse and action == 'pre_clear':
+        instance._cleared_answer_ids = list(instance.user_answers.values_list('pk', flat=True))
+
+
+def _reverse_answer_ids(instance, action, pk_set):
+    return instance._cleared_answer_ids if action == 'post_clear' else pk_set
+
+
+@receiver(m2m_changed, sender=UserAnswer.selected_choices.through)
+def refresh_answer_vector_on_choices(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_vectors_on_commit([instance.user_id])
+    else:
+        answer_ids = _reverse_answer_ids(instance, action, pk_set)
+        if answer_ids:
+            refresh_vectors_on_commit(
+                UserAnswer.objects.filter(pk__in=answer_ids).values_list('user_id', flat=True)
+            )
+
+
+@receiver(post_save, sender=UserAnswer)
+def count_answer_score(sender, instance, created, **kwargs):
+    if created:
+        apply_score_delta(instance.user_id, instance.score_value, 1)
+
+
+@receiver(post_delete, sender=UserAnswer)
+def uncount_answer_score(sender, instance, origin, **kwargs):
+    # Answers of a deleted question are uncounted by ``uncount_question_answers``
+    if _origin_model(origin) not in (User, Question, QuestionCategory):
+        apply_score_delta(instance.user_id, -instance.score_value, -1)
+
+
+@receiver(pre_delete, sender=Question)
+def uncount_question_answers(sender, instance, **kwargs):
+    uncount_question_scores(instance.pk)
+
+
+@receiver(m2m_changed, sender=UserAnswer.selected_choices.through)
+def refresh_answer_score_on_choices(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_answer_scores([instance.pk])
+        instance.refresh_from_db(fields=['score_value'])
+    else:
+        answer_ids = _reverse_answer_ids(instance, action, pk_set)
+        if answer_ids:
+            refresh_answer_scores(answer_ids)
+
+
+@receiver(pre_save, sender=QuestionChoice)
+def remember_choice_value(sender, instance, **kwargs):
+    instance._old_value = QuestionChoice.objects.filter(pk=instance.pk).values_list('value', flat=True).first()
+
+
+@receiver(post_save, sender=QuestionChoice)
+def refresh_answer_scores_on_value(sender, instance, created, **kwargs):
+    if not created and instance._old_value != instance.value:
+        refresh_answer_scores(list(instance.user_answers.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=QuestionChoice)
+def remember_choice_answers(sender, instance, origin, **kwargs):
+    # Deleting the question or its category deletes the answers as well
+    instance._answer_ids = [] if _origin_model(origin) is not QuestionChoice else list(
+        instance.user_answers.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=QuestionChoice)
+def refresh_answer_scores_on_delete(sender, instance, **kwargs):
+    if instance._answer_ids:
+        refresh_answer_scores(instance._answer_ids)
+
+
+@receiver(pre_save, sender=User)
+def remember_verified(sender, instance, update_fields=None, **kwargs):
+    # Saves of other fields, such as last_login, skip the lookup
+    instance._was_verified = None
+    if update_fields is None or 'email_verified' in update_fields:
+        instance._was_verified = User.objects.filter(pk=instance.pk).values_list(
+            'email_verified', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=User)
+def rematch_on_verification(sender, instance, created, **kwargs):
+    # The drain adds or drops them in the matching index and their matches
+    was_verified = instance._was_verified
+    if not created and was_verified is not None and was_verified != instance.email_verified:
+        transaction.on_commit(lambda: _mark_dirty([instance.pk]), robust=True)
@@ -0,0 +1,74 @@
+from celery import shared_task
+from celery.signals import worker_ready
+from django.conf import settings
+
+from .matching import drain_dirty, mark_dirty, prune_matches
+from .models import UserAnswer, UserAnswerVector
+from .shared_vectors import publish_vectors
+from .text_features import fit_idf
+from .vectors import invalidate_schema, renormalize_vectors
+
+
+@shared_task
+def drain_dirty_matches():
+    """Re-score the users whose answers changed since the last drain."""
+    return drain_dirty()
+
+
+@shared_task
+def sweep_matches(batch_size=500):
+    """
+    Fallback full-population pass.
+
+    Marks every verified user with an answer vector dirty, so users whose
+    answers did not change still pick up new candidates.
+    """
+    user_ids = UserAnswerVector.objects.filter(
+        user__email_verified=True
+    ).order_by('user_id').values_list('user_id', flat=True)
+
+    batch = []
+    marked = 0
+    for user_id in user_ids.iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            mark_dirty(batch)
+            marked += len(batch)
+            batch = []
+    mark_dirty(batch)
+    drain_dirty_matches.delay()
+    return marked + len(batch)
+
+
+@shared_task
+def renormalize_answer_vectors():
+    """Re-apply category weights to the stored vectors after a weight change."""
+    return renormalize_vectors()
+
+
+@shared_task
+def fit_text_idf():
+    """Refit the short answer IDF weights and re-weight the stored vectors."""
+    features = UserAnswer.objects.exclude(text_features=b'').values_list('text_features', flat=True)
+    fit_idf(features.iterator(chunk_size=2000))
+    invalidate_schema()
+    return renormalize_vectors()
+
+
+@shared_task
+def prune_expired_matches():
+    """Delete matches past their retention period."""
+    return prune_matches()
+
+
+@shared_task
+def publish_shared_vectors():
+    """Republish the population matrix shared by this host's workers."""
+    if settings.MATCHING_SHARED_VECTORS_DIR:
+        return publish_vectors(block=False)
+
+
+@worker_ready.connect
+def publish_shared_vectors_on_start(**kwargs):
+    # A new host has no copy until the next broadcast otherwise
+    publish_shared_vectors()
@@ -1,3 +1,623 @@
-from django.test import TestCase
+import base64
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import matching
+from .ann import RandomProjectionIndex, measure_recall
+from .factories import QuestionCategoryFactory, QuestionChoiceFactory, QuestionFactory, UserFactory
+from .matching import (
+    MatchingEngine,
+    drain_dirty,
+    generate_matches,
+    get_index,
+    mark_dirty,
+    prune_matches,
+    write_matches,
+)
+from .models import DirtyMatchUser, User, UserAnswer, UserMatch
+from .shared_vectors import get_shared_vectors, publish_vectors
+from .text_features import featurize, fit_idf, get_idf
+from .vectors import get_schema, invalidate_schema, refresh_user_vectors
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(**profile):
+    user = UserFactory()
+    for name, value in profile.items():
+        setattr(user.profile, name, value)
+    user.profile.save()
+    return user
+
+
+def answer(user, question, *choices):
+    user_answer = UserAnswer.objects.create(user=user, question=question)
+    user_answer.selected_choices.set(choices)
+    return user_answer
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MATCHING_SHARED_VECTORS_DIR='')
+class MatchingTestCase(TestCase):
+    def setUp(self):
+        category = QuestionCategoryFactory(weight=1.0)
+        # One-hot choices, so different picks share nothing
+        self.questions = [QuestionFactory(category=category, question_type='multiple_choice') for _ in range(3)]
+        self.choices = [
+            [QuestionChoiceFactory(question=question, value=value) for value in (1, 2)]
+            for question in self.questions
+        ]
+        # Vector refreshes run on commit, which never comes inside a test
+        invalidate_schema()
+
+    def create_answered_user(self, picks, **profile):
+        user = create_user(gender='female', looking_for='both', **profile)
+        for question, choices, pick in zip(self.questions, self.choices, picks):
+            answer(user, question, choices[pick])
+        refresh_user_vectors([user.pk])
+        return user
+
+
+class RandomProjectionIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.matrix = np.array([[1, 0, 0], [1, 1, 0], [0, 0, 1]], dtype=np.float32)
+        self.index = RandomProjectionIndex.build([1, 2, 3], self.matrix, n_tables=4, n_bits=2)
+
+    def test_query_scores_candidates_above_the_threshold(self):
+        user_ids, scores = self.index.query(np.array([1, 0, 0], dtype=np.float32), 0.5)
+
+        order = np.argsort(user_ids)
+        self.assertEqual(user_ids[order].tolist(), [1, 2])
+        np.testing.assert_allclose(scores[order], [1.0, 0.5 ** 0.5], rtol=1e-6)
+
+    def test_query_excludes_users(self):
+        user_ids, _ = self.index.query(np.array([1, 0, 0], dtype=np.float32), 0.5, exclude=[1])
+
+        self.assertEqual(user_ids.tolist(), [2])
+
+    def test_add_replaces_stored_vectors(self):
+        self.index.add([1], np.array([[0, 0, 1]], dtype=np.float32))
+
+        user_ids, _ = self.index.query(np.array([0, 0, 1], dtype=np.float32), 0.5)
+        self.assertEqual(sorted(user_ids.tolist()), [1, 3])
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove(self):
+        self.index.remove([1])
+
+        user_ids, _ = self.index.query(np.array([1, 0, 0], dtype=np.float32), 0.5)
+        self.assertEqual(user_ids.tolist(), [2])
+        self.assertNotIn(1, self.index)
+
+    def test_zero_vectors_are_not_indexed(self):
+        self.index.add([4], np.zeros((1, 3), dtype=np.float32))
+
+        self.assertNotIn(4, self.index)
+
+    def test_measure_recall_of_a_full_scan(self):
+        # One bit plus its flipped neighbour probes every bucket
+        index = RandomProjectionIndex.build([1, 2, 3], self.matrix, n_tables=1, n_bits=1)
+
+        result = measure_recall(index, [1, 2, 3], self.matrix, [0, 1, 2], 0.5)
+
+        self.assertEqual(result['recall'], 1.0)
+        self.assertEqual(result['scanned_fraction'], 1.0)
+
+
+class MatchingEngineTests(MatchingTestCase):
+    def test_ranks_candidates_by_similarity(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        close = self.create_answered_user([0, 0, 1])
+        self.create_answered_user([1, 1, 1])
+
+        matches = MatchingEngine(use_index=False).find_matches(user, User.objects.exclude(pk=user.pk))
+
+        self.assertEqual([candidate_id for candidate_id, _ in matches], [twin.pk, close.pk])
+        self.assertAlmostEqual(matches[0][1], 1.0, places=5)
+
+    def test_limit_keeps_the_best(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        self.create_answered_user([0, 0, 1])
+
+        matches = MatchingEngine(use_index=False).find_matches(user, User.objects.exclude(pk=user.pk), limit=1)
+
+        self.assertEqual([candidate_id for candidate_id, _ in matches], [twin.pk])
+
+    def test_user_without_answers_has_no_matches(self):
+        user = create_user()
+        self.create_answered_user([0, 0, 0])
+
+        self.assertEqual(MatchingEngine(use_index=False).find_matches(user, User.objects.exclude(pk=user.pk)), [])
+
+
+class GenerateMatchesTests(MatchingTestCase):
+    def test_writes_pending_matches(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.user1_id, match.user2_id), (user.pk, twin.pk))
+        self.assertEqual((match.initiator_id, match.status), (user.pk, 'pending'))
+
+    def test_keeps_decided_matches(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        UserMatch.objects.create(user1=user, user2=twin, initiator=twin, compatibility_score=0.9, status='rejected')
+
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.status, match.compatibility_score), ('rejected', 0.9))
+
+    def test_drops_pending_matches_that_no_longer_fit(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        twin.profile.looking_for = 'male'
+        twin.profile.save()
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        self.assertFalse(UserMatch.objects.exists())
+
+    def test_refreshes_pending_matches_initiated_by_the_other_user(self):
+        user = self.create_answered_user([0, 0, 0])
+        other = self.create_answered_user([1, 1, 1])
+        UserMatch.objects.create(user1=user, user2=other, initiator=other, compatibility_score=1.0)
+
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        match = UserMatch.objects.get(user1=user, user2=other)
+        self.assertEqual((match.initiator_id, match.status), (other.pk, 'pending'))
+        self.assertAlmostEqual(match.compatibility_score, 0.0, places=5)
+
+    def test_drops_own_pending_matches_below_the_threshold(self):
+        user = self.create_answered_user([0, 0, 0])
+        other = self.create_answered_user([1, 1, 1])
+        UserMatch.objects.create(user1=user, user2=other, initiator=user, compatibility_score=1.0)
+
+        generate_matches(user, MatchingEngine(use_index=False))
+
+        self.assertFalse(UserMatch.objects.exists())
+
+
+class WriteMatchesTests(TestCase):
+    def setUp(self):
+        self.users = UserFactory.create_batch(3)
+
+    def test_inserts_pending_pairs_lower_id_first(self):
+        low, high = self.users[0], self.users[1]
+
+        self.assertEqual(write_matches([(high.pk, low.pk, 0.8)]), 1)
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.user1_id, match.user2_id, match.initiator_id), (low.pk, high.pk, high.pk))
+        self.assertEqual((match.status, match.compatibility_score), ('pending', 0.8))
+
+    def test_updates_the_score_of_pending_pairs_only(self):
+        low, high = self.users[0], self.users[1]
+        write_matches([(low.pk, high.pk, 0.8)])
+
+        self.assertEqual(write_matches([(high.pk, low.pk, 0.6)]), 1)
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.initiator_id, match.compatibility_score), (low.pk, 0.6))
+
+    def test_leaves_decided_pairs_untouched(self):
+        for other, status in zip(self.users[1:], ('accepted', 'rejected')):
+            UserMatch.objects.create(
+                user1=self.users[0], user2=other, initiator=self.users[0], compatibility_score=0.9, status=status
+            )
+
+        written = write_matches([(self.users[0].pk, other.pk, 0.1) for other in self.users[1:]], batch_size=1)
+
+        self.assertEqual(written, 0)
+        self.assertEqual(
+            sorted(UserMatch.objects.values_list('status', 'compatibility_score')),
+            [('accepted', 0.9), ('rejected', 0.9)],
+        )
+
+
+class RecomputeMatchesTests(MatchingTestCase):
+    def recompute(self):
+        call_command('recompute_matches', '--block-size', '1', stdout=StringIO())
+
+    def test_writes_qualifying_pairs_once(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        self.create_answered_user([1, 1, 1])
+
+        self.recompute()
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.user1_id, match.user2_id, match.status), (user.pk, twin.pk, 'pending'))
+        self.assertAlmostEqual(match.compatibility_score, 1.0, places=5)
+
+    def test_skips_decided_pairs(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        UserMatch.objects.create(user1=user, user2=twin, initiator=twin, compatibility_score=0.6, status='accepted')
+
+        self.recompute()
+
+        match = UserMatch.objects.get()
+        self.assertEqual((match.status, match.compatibility_score), ('accepted', 0.6))
+
+    def test_prunes_pending_pairs_that_no_longer_qualify(self):
+        user = self.create_answered_user([0, 0, 0])
+        other = self.create_answered_user([1, 1, 1])
+        UserMatch.objects.create(user1=user, user2=other, initiator=user, compatibility_score=0.9)
+
+        self.recompute()
+
+        self.assertFalse(UserMatch.objects.exists())
+
+
+class CanonicalPairMigrationTests(TransactionTestCase):
+    migrate_from = [('accounts', '0011_useranswervector_version')]
+    migrate_to = [('accounts', '0012_usermatch_initiator')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps.get_model('accounts', 'UserMatch')
+
+    def test_pairs_are_deduplicated_and_stored_lower_id_first(self):
+        OldUser = self.apps.get_model('accounts', 'User')
+        OldUserMatch = self.apps.get_model('accounts', 'UserMatch')
+        a, b, c = [OldUser.objects.create(email=f'{name}@example.com') for name in 'abc']
+        earlier = timezone.now() - timedelta(days=1)
+        # Decided beats pending, newest wins between pending twins
+        OldUserMatch.objects.create(user1=a, user2=b, compatibility_score=0.1)
+        OldUserMatch.objects.create(user1=b, user2=a, compatibility_score=0.2, status='accepted')
+        OldUserMatch.objects.create(user1=a, user2=c, compatibility_score=0.3)
+        OldUserMatch.objects.filter(user1=a, user2=c).update(updated_at=earlier)
+        OldUserMatch.objects.create(user1=c, user2=a, compatibility_score=0.4)
+        OldUserMatch.objects.create(user1=c, user2=b, compatibility_score=0.5)
+
+        UserMatch = self.migrate()
+
+        self.assertEqual(
+            sorted(UserMatch.objects.values_list('user1', 'user2', 'initiator', 'compatibility_score', 'status')),
+            [
+                (a.pk, b.pk, b.pk, 0.2, 'accepted'),
+                (a.pk, c.pk, c.pk, 0.4, 'pending'),
+                (b.pk, c.pk, c.pk, 0.5, 'pending'),
+            ],
+        )
+
+
+class PruneMatchesTests(TestCase):
+    def setUp(self):
+        user = UserFactory()
+        now = timezone.now()
+        for status, days in [
+            ('pending', 10), ('pending', 2), ('rejected', 40), ('rejected', 10), ('accepted', 400)
+        ]:
+            match = UserMatch.objects.create(
+                user1=user, user2=UserFactory(), initiator=user, compatibility_score=0.8, status=status
+            )
+            UserMatch.objects.filter(pk=match.pk).update(updated_at=now - timedelta(days=days))
+
+    def remaining(self):
+        return sorted(UserMatch.objects.values_list('status', flat=True))
+
+    def test_deletes_expired_matches_in_chunks(self):
+        deleted = prune_matches(pending_days=7, rejected_days=30, chunk_size=1)
+
+        self.assertEqual(deleted, {'pending': 1, 'rejected': 1})
+        self.assertEqual(self.remaining(), ['accepted', 'pending', 'rejected'])
+
+    def test_command_uses_the_given_ages(self):
+        out = StringIO()
+        call_command('prune_matches', '--pending-days', '1', '--rejected-days', '1', stdout=out)
+
+        self.assertIn('Deleted 2 stale pending and 2 rejected matches', out.getvalue())
+        self.assertEqual(self.remaining(), ['accepted'])
+
+
+class DrainDirtyTests(MatchingTestCase):
+    def test_drains_queued_users(self):
+        user = self.create_answered_user([0, 0, 0])
+        twin = self.create_answered_user([0, 0, 0])
+        mark_dirty([user.pk])
+
+        self.assertEqual(drain_dirty(), 1)
+
+        self.assertFalse(DirtyMatchUser.objects.exists())
+        self.assertTrue(UserMatch.objects.filter(user1=user, user2=twin).exists())
+
+    def test_marking_again_bumps_marked_at(self):
+        user = self.create_answered_user([0, 0, 0])
+        mark_dirty([user.pk])
+        marked_at = DirtyMatchUser.objects.get().marked_at
+
+        mark_dirty([user.pk])
+
+        self.assertGreater(DirtyMatchUser.objects.get().marked_at, marked_at)
+
+    def test_rescores_users_marked_while_draining(self):
+        user = self.create_answered_user([0, 0, 0])
+        mark_dirty([user.pk])
+        rescored = []
+
+        def mark_once(user, engine):
+            if not rescored:
+                mark_dirty([user.pk])
+            rescored.append(user.pk)
+
+        with mock.patch('accounts.matching.generate_matches', side_effect=mark_once):
+            drain_dirty()
+
+        self.assertEqual(rescored, [user.pk, user.pk])
+        self.assertFalse(DirtyMatchUser.objects.exists())
+
+    @override_settings(MATCHING_ANN_MIN_POPULATION=1)
+    def test_drain_refreshes_the_index(self):
+        self.addCleanup(setattr, matching, '_index_version', None)
+        self.addCleanup(setattr, matching, '_index', None)
+        user = self.create_answered_user([0, 0, 0])
+        other = self.create_answered_user([1, 1, 1])
+        matching._index_version = None
+        index = get_index(get_schema())
+        self.assertIn(other.pk, index)
+
+        User.objects.filter(pk=other.pk).update(email_verified=False)
+        mark_dirty([user.pk, other.pk])
+        drain_dirty()
+
+        self.assertIn(user.pk, index)
+        self.assertNotIn(other.pk, index)
+
+    def test_broker_errors_do_not_fail_committed_writes(self):
+        user = create_user()
+
+        with mock.patch('accounts.signals.drain_dirty_matches.delay', side_effect=OSError('broker down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                answer(user, self.questions[0], self.choices[0][0])
+
+        # Vectors were stored and the user queued for the next drain
+        self.assertTrue(DirtyMatchUser.objects.filter(user=user).exists())
+
+    def test_verification_change_marks_user_dirty(self):
+        user = self.create_answered_user([0, 0, 0])
+        user.email_verified = False
+
+        with mock.patch('accounts.signals.drain_dirty_matches.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                user.save()
+
+        delay.assert_called_once_with()
+        self.assertTrue(DirtyMatchUser.objects.filter(user=user).exists())
+
+
+class SharedVectorsTests(MatchingTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MATCHING_SHARED_VECTORS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_scores_match_the_vector_store(self):
+        user = self.create_answered_user([0, 0, 0])
+        self.create_answered_user([0, 0, 1])
+        self.create_answered_user([0, 1, 1])
+        candidates = User.objects.exclude(pk=user.pk)
+        exact = MatchingEngine(use_index=False).find_matches(user, candidates)
+        publish_vectors()
+
+        shared = MatchingEngine(use_index=False).find_matches(user, candidates)
+
+        self.assertIsNotNone(get_shared_vectors())
+        self.assertEqual([pair[0] for pair in shared], [pair[0] for pair in exact])
+
+    def test_old_versions_are_not_used(self):
+        self.create_answered_user([0, 0, 0])
+        publish_vectors()
+        later = time.time() + 3 * settings.MATCHING_SHARED_VECTORS_SECONDS
+
+        with mock.patch('accounts.shared_vectors.time.time', return_value=later):
+            self.assertIsNone(get_shared_vectors())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TextIdfTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fitted_idf_survives_a_cache_flush(self):
+        idf = fit_idf([featurize('hiking').tobytes(), featurize('hiking and cooking').tobytes()])
+        cache.clear()
+
+        np.testing.assert_array_equal(get_idf(), idf)
+
+    def test_ones_before_the_first_fit(self):
+        np.testing.assert_array_equal(get_idf(), np.ones(256))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkCategoryAnswerTests(TestCase):
+    def setUp(self):
+        self.category = QuestionCategoryFactory()
+        self.scale = QuestionFactory(category=self.category, question_type='scale')
+        self.scale_choices = [QuestionChoiceFactory(question=self.scale, value=value) for value in (1, 5)]
+        self.text = QuestionFactory(category=self.category, question_type='short_answer')
+        self.user = UserFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/v1/auth/question-categories/{self.category.pk}/answers/'
+
+    def submit(self, choice):
+        return self.client.post(self.url, {'answers': [
+            {'question': self.scale.pk, 'selected_choice_ids': [choice.pk], 'text_answer': ''},
+            {'question': self.text.pk, 'selected_choice_ids': [], 'text_answer': 'hiking with dogs'},
+        ]}, format='json')
+
+    def test_creates_answers_and_score(self):
+        response = self.submit(self.scale_choices[1])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 2)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score_sum, self.user.score_count), (5.0, 2))
+        self.assertEqual(self.user.matching_score, 2.5)
+
+    def test_resubmit_replaces_answers(self):
+        self.submit(self.scale_choices[1])
+        self.submit(self.scale_choices[0])
+
+        scale_answer = UserAnswer.objects.get(user=self.user, question=self.scale)
+        self.assertEqual(list(scale_answer.selected_choices.all()), [self.scale_choices[0]])
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score_sum, self.user.score_count), (1.0, 2))
+
+    def test_rejects_choices_of_other_questions(self):
+        other = QuestionChoiceFactory()
+
+        response = self.submit(other)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserAnswer.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ScoreAggregateTests(TestCase):
+    def setUp(self):
+        self.scale = QuestionFactory(question_type='scale')
+        self.choices = [QuestionChoiceFactory(question=self.scale, value=value) for value in (2, 4)]
+        self.user = UserFactory()
+        self.answer = answer(self.user, self.scale, self.choices[1])
+
+    def test_choice_value_change_refreshes_score(self):
+        self.choices[1].value = 6
+        self.choices[1].save()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score_sum, self.user.matching_score), (6.0, 6.0))
+
+    def test_reverse_clear_refreshes_score(self):
+        self.choices[1].user_answers.clear()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score_sum, self.user.score_count), (0.0, 1))
+
+    def test_answer_delete_uncounts_score(self):
+        self.answer.delete()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score_sum, self.user.score_count, self.user.matching_score), (0.0, 0, 0.0))
+
+    def test_user_with_answers_can_be_deleted(self):
+        self.user.delete()
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(UserAnswer.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QuestionDeleteTests(TestCase):
+    def setUp(self):
+        self.question = QuestionFactory(question_type='scale')
+        self.choice = QuestionChoiceFactory(question=self.question, value=3)
+        self.users = UserFactory.create_batch(5)
+        for user in self.users:
+            answer(user, self.question, self.choice)
+
+    def test_marks_answering_users_dirty_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.question.delete()
+
+        self.assertEqual(len(callbacks), 1)
+        with mock.patch('accounts.signals.drain_dirty_matches.delay') as delay:
+            callbacks[0]()
+        delay.assert_called_once_with()
+        self.assertEqual(
+            set(DirtyMatchUser.objects.values_list('user_id', flat=True)), {user.pk for user in self.users}
+        )
+
+    def test_uncounts_scores(self):
+        other = QuestionFactory(question_type='scale')
+        answer(self.users[0], other, QuestionChoiceFactory(question=other, value=5))
+
+        self.question.delete()
+
+        scores = dict(User.objects.values_list('pk', 'score_sum'))
+        self.assertEqual(scores, {self.users[0].pk: 5.0, **{user.pk: 0.0 for user in self.users[1:]}})
+        self.users[0].refresh_from_db()
+        self.assertEqual((self.users[0].score_count, self.users[0].matching_score), (1, 5.0))
+
+    def test_delete_queries_do_not_grow_with_answers(self):
+        # Collect, dirty users, one score UPDATE and the cascade deletes
+        with self.assertNumQueries(9):
+            self.question.delete()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MatchPaginationTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.matches = [
+            UserMatch.objects.create(user1=self.user, user2=UserFactory(), initiator=self.user, compatibility_score=score)
+            for score in (0.9, 0.7, 0.7, 0.6, 0.55)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_follow_score_order(self):
+        seen = []
+        url = '/api/v1/auth/matches/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(match['id'] for match in response.data['results'])
+            url = response.data['next']
+
+        expected = sorted(self.matches, key=lambda match: (-match.compatibility_score, -match.pk))
+        self.assertEqual(seen, [match.pk for match in expected])
+
+    def test_lists_pending_matches_unless_asked(self):
+        UserMatch.objects.filter(pk=self.matches[0].pk).update(status='rejected')
+
+        pending = self.client.get('/api/v1/auth/matches/')
+        rejected = self.client.get('/api/v1/auth/matches/?status=rejected')
+
+        self.assertEqual(
+            {match['id'] for match in pending.data['results']}, {match.pk for match in self.matches[1:]}
+        )
+        self.assertEqual([match['id'] for match in rejected.data['results']], [self.matches[0].pk])
+        self.assertEqual(self.client.get('/api/v1/auth/matches/?status=deleted').status_code, 400)
+
+    def test_invalid_cursor_is_not_found(self):
+        cursor = base64.urlsafe_b64encode(b'not-a-cursor').decode('ascii')
+
+        response = self.client.get(f'/api/v1/auth/matches/?cursor={cursor}')
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,71 @@
+"""
+Offline text features for short answer questions.
+
+Answers are hashed into a fixed number of word and bigram buckets with
+scikit-learn's ``HashingVectorizer``, so no vocabulary or model download is
+needed. Each answer stores its sub-linear term frequencies; the inverse
+document frequencies are fitted locally over all stored answers and applied
+as slot weights by ``accounts.vectors.VectorSchema``. The fitted weights are
+stored in ``accounts.models.TextIdf`` and cached, so an evicted cache key
+reloads them instead of silently dropping back to ones.
+"""
+import numpy as np
+from django.core.cache import cache
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from .models import TextIdf
+
+TEXT_FEATURES = 256
+TEXT_IDF_KEY = 'accounts:text_idf'
+
+_vectorizer = HashingVectorizer(
+    n_features=TEXT_FEATURES,
+    ngram_range=(1, 2),
+    stop_words='english',
+    alternate_sign=False,
+    norm=None,
+)
+
+
+def featurize_many(texts):
+    """Return the unit-length float32 term frequency vectors of ``texts``, one row each."""
+    if not texts:
+        return np.zeros((0, TEXT_FEATURES), dtype=np.float32)
+    counts = _vectorizer.transform(texts).toarray().astype(np.float32)
+    np.log1p(counts, out=counts)
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    return np.divide(counts, norms, out=counts, where=norms > 0)
+
+
+def featurize(text):
+    """Return the unit-length float32 term frequency vector of ``text``."""
+    return featurize_many([text])[0]
+
+
+def get_idf():
+    """Return the fitted inverse document frequencies, or ones before the first fit."""
+    idf = cache.get(TEXT_IDF_KEY)
+    if idf is None:
+        blob = TextIdf.objects.filter(pk=1).values_list('idf', flat=True).first()
+        if blob is None:
+            return np.ones(TEXT_FEATURES, dtype=np.float32)
+        idf = np.frombuffer(bytes(blob), dtype=np.float32).tolist()
+        cache.set(TEXT_IDF_KEY, idf, None)
+    return np.asarray(idf, dtype=np.float32)
+
+
+def fit_idf(feature_blobs):
+    """
+    Fit smoothed inverse document frequencies over stored answer features
+    and publish them for ``get_idf``.
+    """
+    document_count = 0
+    document_frequency = np.zeros(TEXT_FEATURES, dtype=np.int64)
+    for blob in feature_blobs:
+        document_count += 1
+        document_frequency += np.frombuffer(bytes(blob), dtype=np.float32) > 0
+
+    idf = (np.log((1 + document_count) / (1 + document_frequency)) + 1).round(4).astype(np.float32)
+    TextIdf.objects.update_or_create(pk=1, defaults={'idf': idf.tobytes()})
+    cache.set(TEXT_IDF_KEY, idf.tolist(), None)
+    return idf
@@ -8,6 +8,7 @@ from .views import (
     QuestionCategoryViewSet,
     UserAnswerView,
     MatchingView,
+    CompatibilityView,
     UserMatchUpdateView,
     EmailVerificationView,
     GoogleAuthView,
@@ -30,6 +31,7 @@ urlpatterns = [
     path('matches/', MatchingView.as_view(), name='matches'),
     path('matches/<int:pk>/update/', UserMatchUpdateView.as_view(), name='update-match'),
     path('users/', UserListView.as_view(), name='users'),
+    path('users/<int:pk>/compatibility/', CompatibilityView.as_view(), name='user-compatibility'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('logout/', LogoutView.as_view(), name='logout'),
 ]
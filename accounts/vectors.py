@@ -0,0 +1,387 @@
+"""
+Fixed-layout answer vectors.
+
+A ``VectorSchema`` assigns every question in the catalog a fixed slot range:
+one slot per single choice or scale question and one one-hot slot per choice
+of a multiple choice question. Short answers share one trailing block of
+hashed text features (see ``accounts.text_features``). Every user encodes
+into the same float32 layout, so vectors can be stacked, stored and compared
+directly.
+
+Each slot is also scaled by the square root of its ``QuestionCategory.weight``
+before normalization, which turns the plain dot product of two normalized
+vectors into a category-weighted cosine similarity. The text block is scaled
+by its fitted IDF and the square root of ``MATCHING_TEXT_WEIGHT`` instead.
+
+Encoded vectors are materialized in ``UserAnswerVector`` and refreshed when a
+user's answers change, so the matcher reads them in one bulk fetch. The store
+keeps the raw vector next to the weighted, normalized one so a weight change
+only needs a re-normalization, not a re-encode from the answers.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from scipy import sparse
+
+from .models import Question, QuestionCategory, QuestionChoice, UserAnswer, UserAnswerVector
+from .text_features import TEXT_FEATURES, get_idf
+
+SCHEMA_GENERATION_KEY = 'accounts:vector_schema:generation'
+
+
+class VectorSchema:
+    def __init__(self, questions, choices, category_weights=None, text_idf=None, text_weight=1.0):
+        """
+        ``questions`` is an iterable of ``(id, question_type, category_id)``,
+        ``choices`` an iterable of ``(id, question_id, value)`` and
+        ``category_weights`` maps category ids to their weight (default 1).
+        ``text_idf`` and ``text_weight`` weight the short answer text block.
+        """
+        category_weights = category_weights or {}
+        choices_by_question = {}
+        for choice_id, question_id, value in sorted(choices):
+            choices_by_question.setdefault(question_id, []).append((choice_id, value))
+
+        self.question_types = {}
+        self.question_slots = {}
+        self.choice_slots = {}
+        layout = []
+        slot_weights = []
+        for question_id, question_type, category_id in sorted(questions):
+            self.question_types[question_id] = question_type
+            question_choices = choices_by_question.get(question_id, [])
+            start = len(slot_weights)
+            if question_type == 'multiple_choice':
+                for choice_id, value in question_choices:
+                    self.choice_slots[choice_id] = len(slot_weights)
+                    slot_weights.append(category_weights.get(category_id, 1.0))
+            elif question_type != 'short_answer':
+                self.question_slots[question_id] = start
+                slot_weights.append(category_weights.get(category_id, 1.0))
+            layout.append((question_id, question_type, tuple(question_choices)))
+
+        self.text_slots = None
+        if 'short_answer' in self.question_types.values():
+            self.text_slots = slice(len(slot_weights), len(slot_weights) + TEXT_FEATURES)
+            idf = np.ones(TEXT_FEATURES) if text_idf is None else np.asarray(text_idf)
+            slot_weights.extend(text_weight * idf ** 2)
+            layout.append(('text', TEXT_FEATURES))
+
+        self.width = len(slot_weights)
+        self.dense_columns = np.asarray(sorted(self.question_slots.values()), dtype=np.int64)
+        # One-hot choice slots and text slots are mostly zero
+        self.sparse_columns = np.setdiff1d(np.arange(self.width), self.dense_columns)
+        self.version = hashlib.sha1(repr(layout).encode()).hexdigest()[:16]
+        # Weights are kept out of the layout version: changing them does not
+        # invalidate raw vectors, only their normalized form
+        self.scale = np.sqrt(np.maximum(np.asarray(slot_weights, dtype=np.float32), 0))
+        self.weights_version = hashlib.sha1(self.scale.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def from_catalog(cls):
+        return cls(
+            Question.objects.values_list('id', 'question_type', 'category_id'),
+            QuestionChoice.objects.values_list('id', 'question_id', 'value'),
+            dict(QuestionCategory.objects.values_list('id', 'weight')),
+            text_idf=get_idf(),
+            text_weight=settings.MATCHING_TEXT_WEIGHT,
+        )
+
+    def normalize(self, matrix):
+        """Apply the category weights to raw vectors and scale them to unit length."""
+        weighted = matrix * self.scale
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        return np.divide(weighted, norms, out=np.zeros_like(weighted), where=norms > 0)
+
+    def encode_users(self, users):
+        """
+        Encode the answers of ``users`` (a queryset or list of ids).
+
+        Returns ``(user_ids, matrix)`` where row ``i`` of the float32
+        ``matrix`` is the vector of ``user_ids[i]``. Users without answers
+        are omitted.
+        """
+        answers = list(
+            UserAnswer.objects.filter(user__in=users).values_list(
+                'id', 'user_id', 'question_id', 'text_features'
+            )
+        )
+        user_ids = sorted({answer[1] for answer in answers})
+        row_of = {user_id: i for i, user_id in enumerate(user_ids)}
+        matrix = np.zeros((len(user_ids), self.width), dtype=np.float32)
+        if not answers:
+            return np.asarray(user_ids, dtype=np.int64), matrix
+
+        answer_rows = {}
+        for answer_id, user_id, question_id, text_features in answers:
+            row = row_of[user_id]
+            answer_rows[answer_id] = row
+            if text_features and self.question_types.get(question_id) == 'short_answer':
+                matrix[row, self.text_slots] += np.frombuffer(bytes(text_features), dtype=np.float32)
+
+        selections = UserAnswer.selected_choices.through.objects.filter(
+            useranswer__user__in=users
+        ).order_by('questionchoice__order').values_list(
+            'useranswer_id', 'questionchoice_id', 'questionchoice__question_id', 'questionchoice__value'
+        )
+
+        filled = set()
+        for answer_id, choice_id, question_id, value in selections:
+            row = answer_rows[answer_id]
+            if choice_id in self.choice_slots:
+                matrix[row, self.choice_slots[choice_id]] = 1.0
+            elif question_id in self.question_slots and answer_id not in filled:
+                # Single choice and scale questions keep their first choice
+                matrix[row, self.question_slots[question_id]] = value
+                filled.add(answer_id)
+
+        if self.text_slots is not None:
+            # Every user's text block has unit length however many short
+            # answers they gave, so its weight alone sets its influence
+            text = matrix[:, self.text_slots]
+            norms = np.linalg.norm(text, axis=1, keepdims=True)
+            matrix[:, self.text_slots] = np.divide(text, norms, out=np.zeros_like(text), where=norms > 0)
+
+        return np.asarray(user_ids, dtype=np.int64), matrix
+
+    def encode_user(self, user):
+        """Return the vector of a single user, or ``None`` if they have no answers."""
+        user_ids, matrix = self.encode_users([user.pk])
+        return matrix[0] if len(user_ids) else None
+
+
+class ScoringMatrix:
+    """
+    Population matrix split into its dense single value block and its
+    mostly-zero block of multiple choice one-hot and text slots.
+
+    The choice block is stored as CSR when its density is below
+    ``MATCHING_SPARSE_MAX_DENSITY`` (or when ``use_sparse`` forces it), which
+    cuts memory and bandwidth for catalogs with many choices per question.
+    Scores are the sum of the dense and choice block products, so both
+    backends return the same values.
+    """
+
+    def __init__(self, matrix, schema, use_sparse=None):
+        choices = matrix[:, schema.sparse_columns]
+        self.density = np.count_nonzero(choices) / choices.size if choices.size else 0.0
+        if use_sparse is None:
+            use_sparse = self.density < settings.MATCHING_SPARSE_MAX_DENSITY
+        self.schema = schema
+        self.shape = matrix.shape
+        self.is_sparse = use_sparse
+        self.dense = np.ascontiguousarray(matrix[:, schema.dense_columns])
+        self.choices = sparse.csr_matrix(choices) if use_sparse else np.ascontiguousarray(choices)
+
+    @classmethod
+    def from_parts(cls, schema, dense, choices, density=None):
+        """
+        Wrap blocks that are already split, such as the memory-mapped ones
+        of ``accounts.shared_vectors``, without copying them.
+        """
+        scoring = cls.__new__(cls)
+        scoring.schema = schema
+        scoring.shape = (dense.shape[0], schema.width)
+        scoring.is_sparse = sparse.issparse(choices)
+        scoring.density = density
+        scoring.dense = dense
+        scoring.choices = choices
+        return scoring
+
+    def __len__(self):
+        return self.shape[0]
+
+    def take(self, rows):
+        """The rows at positions ``rows``, as a new ``ScoringMatrix``."""
+        return ScoringMatrix.from_parts(self.schema, self.dense[rows], self.choices[rows], self.density)
+
+    def dot(self, vector):
+        """Scores of every row against one full-width ``vector``."""
+        return (
+            self.dense @ vector[self.schema.dense_columns]
+            + self.choices @ vector[self.schema.sparse_columns]
+        )
+
+    def block_scores(self, start, stop):
+        """Scores of rows ``start:stop`` against every row, as a dense array."""
+        choice_block = self.choices[start:stop]
+        if self.is_sparse:
+            choice_block = choice_block.toarray()
+        return self.dense[start:stop] @ self.dense.T + np.asarray(self.choices @ choice_block.T).T
+
+    def memory_footprint(self):
+        """Bytes taken by the full dense matrix, by the split CSR form and by this backend."""
+        rows, width = self.shape
+        dense_bytes = rows * width * np.dtype(np.float32).itemsize
+        csr = self.choices if self.is_sparse else sparse.csr_matrix(self.choices)
+        sparse_bytes = self.dense.nbytes + csr.data.nbytes + csr.indices.nbytes + csr.indptr.nbytes
+        return {
+            'dense': dense_bytes,
+            'sparse': sparse_bytes,
+            'selected': sparse_bytes if self.is_sparse else dense_bytes,
+            'choice_density': self.density,
+        }
+
+
+_schema = None
+_schema_generation = None
+
+
+def get_schema():
+    """
+    Return the schema for the current question catalog.
+
+    The schema is rebuilt only after ``invalidate_schema`` bumps the shared
+    generation counter, so every worker picks up catalog edits.
+    """
+    global _schema, _schema_generation
+    generation = cache.get(SCHEMA_GENERATION_KEY, 0)
+    if _schema is None or generation != _schema_generation:
+        _schema = VectorSchema.from_catalog()
+        _schema_generation = generation
+    return _schema
+
+
+def invalidate_schema():
+    try:
+        cache.incr(SCHEMA_GENERATION_KEY)
+    except ValueError:
+        cache.set(SCHEMA_GENERATION_KEY, 1, None)
+
+
+def vector_version(normalized):
+    """Version of a normalized vector, derived from its bytes."""
+    return hashlib.sha1(normalized.tobytes()).hexdigest()[:16]
+
+
+def refresh_user_vectors(user_ids, schema=None):
+    """
+    Re-encode and store the vectors of ``user_ids``.
+
+    Returns ``(user_ids, normalized)`` for the users that have answers.
+    """
+    schema = schema or get_schema()
+    user_ids = list(user_ids)
+    encoded_ids, matrix = schema.encode_users(user_ids)
+    normalized = schema.normalize(matrix)
+    UserAnswerVector.objects.bulk_create(
+        [
+            UserAnswerVector(
+                user_id=user_id,
+                schema_version=schema.version,
+                vector=row.tobytes(),
+                weights_version=schema.weights_version,
+                normalized=normalized_row.tobytes(),
+                version=vector_version(normalized_row),
+            )
+            for user_id, row, normalized_row in zip(encoded_ids.tolist(), matrix, normalized)
+        ],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['schema_version', 'vector', 'weights_version', 'normalized', 'version', 'updated_at'],
+    )
+    # Users whose last answer was removed no longer have a vector
+    UserAnswerVector.objects.filter(user_id__in=set(user_ids) - set(encoded_ids.tolist())).delete()
+    return encoded_ids, normalized
+
+
+def _stack(blobs, width):
+    return np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(blobs), width)
+
+
+def _store_normalized(user_ids, raw_blobs, schema):
+    """Re-normalize stored raw vectors with the current weights and save them."""
+    normalized = schema.normalize(_stack(raw_blobs, schema.width))
+    UserAnswerVector.objects.bulk_update(
+        [
+            UserAnswerVector(
+                user_id=user_id,
+                weights_version=schema.weights_version,
+                normalized=row.tobytes(),
+                version=vector_version(row),
+            )
+            for user_id, row in zip(user_ids, normalized)
+        ],
+        ['weights_version', 'normalized', 'version'],
+    )
+    return normalized
+
+
+def load_vectors(users, schema=None, versions=False):
+    """
+    Read the weighted, normalized vectors of ``users`` (a queryset or list
+    of ids) from the store.
+
+    Returns ``(user_ids, matrix)`` with one unit-length row per user that
+    has answers, and with ``versions`` a third array holding the
+    ``UserAnswerVector.version`` of each row. Vectors stored with an older
+    schema version are re-encoded and vectors normalized with older weights
+    are re-normalized, both in bulk, and written back before being returned.
+    """
+    schema = schema or get_schema()
+    rows = UserAnswerVector.objects.filter(user__in=users).values_list(
+        'user_id', 'schema_version', 'weights_version', 'vector', 'normalized', 'version'
+    )
+
+    user_ids = []
+    blobs = []
+    row_versions = []
+    reweighted_ids = []
+    reweighted_blobs = []
+    stale_ids = []
+    for user_id, schema_version, weights_version, vector, normalized, version in rows:
+        if schema_version != schema.version:
+            stale_ids.append(user_id)
+        elif weights_version != schema.weights_version:
+            reweighted_ids.append(user_id)
+            reweighted_blobs.append(bytes(vector))
+        else:
+            user_ids.append(user_id)
+            blobs.append(bytes(normalized))
+            row_versions.append(version)
+
+    user_ids = [np.asarray(user_ids, dtype=np.int64)]
+    matrices = [_stack(blobs, schema.width)]
+    if reweighted_ids:
+        user_ids.append(np.asarray(reweighted_ids, dtype=np.int64))
+        matrices.append(_store_normalized(reweighted_ids, reweighted_blobs, schema))
+    if stale_ids:
+        refreshed_ids, refreshed = refresh_user_vectors(stale_ids, schema)
+        user_ids.append(refreshed_ids)
+        matrices.append(refreshed)
+    if versions:
+        # Rewritten rows carry the version of what was just stored
+        row_versions.extend(vector_version(row) for matrix in matrices[1:] for row in matrix)
+    if len(matrices) == 1:
+        user_ids, matrix = user_ids[0], matrices[0]
+    else:
+        user_ids, matrix = np.concatenate(user_ids), np.vstack(matrices)
+    if versions:
+        return user_ids, matrix, np.asarray(row_versions, dtype='U16')
+    return user_ids, matrix
+
+
+def renormalize_vectors(batch_size=1000):
+    """
+    Re-normalize every stored vector built with outdated category weights.
+
+    Only the raw vectors are read back; no answers are re-encoded. Returns
+    the number of vectors updated.
+    """
+    schema = get_schema()
+    outdated = UserAnswerVector.objects.filter(schema_version=schema.version).exclude(
+        weights_version=schema.weights_version
+    ).order_by('user_id')
+
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(outdated.filter(user_id__gt=last_id).values_list('user_id', 'vector')[:batch_size])
+        if not batch:
+            return updated
+        user_ids = [user_id for user_id, _ in batch]
+        _store_normalized(user_ids, [bytes(vector) for _, vector in batch], schema)
+        updated += len(batch)
+        last_id = user_ids[-1]
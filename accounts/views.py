@@ -5,13 +5,11 @@ from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.core.mail import send_mail
 from django.conf import settings
 import secrets
-from datetime import datetime
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import os
 import random
 from django.db.models import Q
@@ -25,6 +23,8 @@ from .models import (
     UserAnswer,
     UserMatch
 )
+from .pagination import ScoreCursorPagination
+from .score_cache import get_pair_score
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
@@ -33,6 +33,7 @@ from .serializers import (
     QuestionCategorySerializer,
     QuestionSerializer,
     UserAnswerSerializer,
+    BulkCategoryAnswerSerializer,
     UserMatchSerializer,
     UserMatchUpdateSerializer,
     EmailVerificationSerializer,
@@ -126,6 +127,17 @@ class QuestionCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = QuestionCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @action(detail=True, methods=['post'], serializer_class=BulkCategoryAnswerSerializer)
+    def answers(self, request, pk=None):
+        """Answer every question of the category in one request."""
+        serializer = self.get_serializer(data=request.data, context={
+            **self.get_serializer_context(),
+            'category': self.get_object(),
+        })
+        serializer.is_valid(raise_exception=True)
+        answers = serializer.save()
+        return Response(UserAnswerSerializer(answers, many=True).data, status=status.HTTP_200_OK)
+
 class UserAnswerView(generics.ListCreateAPIView):
     serializer_class = UserAnswerSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -134,83 +146,40 @@ class UserAnswerView(generics.ListCreateAPIView):
         return UserAnswer.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
+        # User.matching_score is kept up to date by accounts.signals
         serializer.save(user=self.request.user)
-        self._update_matching_score(self.request.user)
-
-    def _update_matching_score(self, user):
-        # Update the user's matching score based on their answers
-        answers = UserAnswer.objects.filter(user=user)
-        if answers.exists():
-            # Simple scoring: average of all answers
-            score = sum(answer.scale_value or 0 for answer in answers) / answers.count()
-            user.matching_score = score
-            user.last_score_update = datetime.now()
-            user.save()
 
-class MatchingView(APIView):
+class MatchingView(generics.ListAPIView):
+    serializer_class = UserMatchSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ScoreCursorPagination
 
-    def get(self, request):
-        user = request.user
-        # Get all users except the current user and already matched users
-        existing_matches = UserMatch.objects.filter(
-            Q(user1=user) | Q(user2=user)
-        ).values_list('user1_id', 'user2_id')
-        
-        matched_users = set()
-        for match in existing_matches:
-            matched_users.add(match[0])
-            matched_users.add(match[1])
-        
-        potential_matches = User.objects.filter(
-            email_verified=True  # Only match with verified users
-        ).exclude(
-            id__in=matched_users
-        ).exclude(
-            id=user.id
-        )
-
-        matches = []
-        user_vector = self._get_user_answer_vector(user)
-        
-        if user_vector is not None:
-            for potential_match in potential_matches:
-                match_vector = self._get_user_answer_vector(potential_match)
-                if match_vector is not None:
-                    # Calculate similarity score
-                    similarity = cosine_similarity([user_vector], [match_vector])[0][0]
-                    if similarity > 0.5:  # Minimum threshold for matching
-                        match = UserMatch.objects.create(
-                            user1=user,
-                            user2=potential_match,
-                            compatibility_score=float(similarity)
-                        )
-                        matches.append(match)
+    def get_queryset(self):
+        # Matches are generated in the background by accounts.tasks. New
+        # pending ones are listed unless ?status= asks for decided ones
+        match_status = self.request.query_params.get('status', 'pending')
+        if match_status not in dict(UserMatch._meta.get_field('status').choices):
+            raise ValidationError({'status': 'Invalid status'})
+        return UserMatch.objects.filter(
+            Q(user1=self.request.user) | Q(user2=self.request.user), status=match_status
+        ).select_related('user1__profile', 'user2__profile')
 
-        serializer = UserMatchSerializer(matches, many=True)
-        return Response(serializer.data)
+class CompatibilityView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-    def _get_user_answer_vector(self, user):
-        answers = UserAnswer.objects.filter(user=user).select_related('question')
-        if not answers.exists():
-            return None
-            
-        vector = []
-        for answer in answers:
-            if answer.question.question_type in ['single_choice', 'scale']:
-                choices = answer.selected_choices.all()
-                if choices.exists():
-                    vector.append(choices.first().value)
-                else:
-                    vector.append(0)
-            elif answer.question.question_type == 'multiple_choice':
-                choices = answer.selected_choices.all()
-                vector.extend([choice.value for choice in choices])
-            elif answer.question.question_type == 'short_answer':
-                # For text answers, we'll use a simple length-based metric
-                vector.append(len(answer.text_answer.strip()))
-                
-        return np.array(vector) if vector else None
+    def get(self, request, pk):
+        # Only users already matched with each other, whatever the status,
+        # so scores cannot be probed past the candidate filters
+        match = get_object_or_404(
+            UserMatch,
+            user1_id=min(request.user.pk, pk),
+            user2_id=max(request.user.pk, pk),
+        )
+        other = match.other_user(request.user)
+        return Response({
+            'user': other.pk,
+            'compatibility_score': get_pair_score(request.user.pk, other.pk),
+        })
 
 class UserMatchUpdateView(generics.UpdateAPIView):
     serializer_class = UserMatchUpdateSerializer
@@ -218,10 +187,12 @@ class UserMatchUpdateView(generics.UpdateAPIView):
 
     def get_object(self):
         match_id = self.kwargs['pk']
+        # Only the side that did not initiate the match can answer it
         return get_object_or_404(
-            UserMatch,
+            UserMatch.objects.filter(
+                Q(user1=self.request.user) | Q(user2=self.request.user)
+            ).exclude(initiator=self.request.user),
             id=match_id,
-            user2=self.request.user,
             status='pending'
         )
 
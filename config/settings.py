@@ -5,6 +5,9 @@ Django settings for kelibe project.
 from datetime import timedelta
 from pathlib import Path
 import os
+from celery.schedules import crontab
+from kombu import Exchange, Queue
+from kombu.common import Broadcast
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -226,6 +229,64 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'drain-dirty-matches': {
+        'task': 'accounts.tasks.drain_dirty_matches',
+        'schedule': timedelta(minutes=1),
+    },
+    'fit-text-idf': {
+        'task': 'accounts.tasks.fit_text_idf',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'sweep-matches': {
+        'task': 'accounts.tasks.sweep_matches',
+        'schedule': crontab(hour=3, minute=0, day_of_week='sunday'),
+    },
+    'prune-matches': {
+        'task': 'accounts.tasks.prune_expired_matches',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
+# Matching settings
+# Pending matches kept per user, best scores first
+MATCHING_MAX_MATCHES = int(os.getenv('MATCHING_MAX_MATCHES', 200))
+# Weight of the short answer text block relative to a category weight of 1
+MATCHING_TEXT_WEIGHT = float(os.getenv('MATCHING_TEXT_WEIGHT', 1.0))
+# Multiple choice blocks sparser than this are scored as CSR matrices
+MATCHING_SPARSE_MAX_DENSITY = float(os.getenv('MATCHING_SPARSE_MAX_DENSITY', 0.1))
+# Verified population size from which matching uses the approximate index;
+# 0 keeps exact scoring. Off by default: on `benchmark_ann --synthetic 50000`
+# no table and bit count gave both good recall and a speedup over the scan
+MATCHING_ANN_MIN_POPULATION = int(os.getenv('MATCHING_ANN_MIN_POPULATION', 0))
+MATCHING_ANN_REBUILD_SECONDS = int(os.getenv('MATCHING_ANN_REBUILD_SECONDS', 300))
+MATCHING_ANN_TABLES = int(os.getenv('MATCHING_ANN_TABLES', 16))
+MATCHING_ANN_BITS = int(os.getenv('MATCHING_ANN_BITS', 8))
+# Host-local directory of the memory-mapped population matrix shared by the
+# workers, republished every MATCHING_SHARED_VECTORS_SECONDS; unset, every
+# worker loads vectors on its own
+MATCHING_SHARED_VECTORS_DIR = os.getenv('MATCHING_SHARED_VECTORS_DIR', '')
+MATCHING_SHARED_VECTORS_SECONDS = int(os.getenv('MATCHING_SHARED_VECTORS_SECONDS', 300))
+if MATCHING_SHARED_VECTORS_DIR:
+    # Broadcast to every worker, so each host publishes its own copy; the
+    # workers of one host skip publishing while a fresh copy exists
+    CELERY_TASK_QUEUES = [Queue('celery', Exchange('celery'), routing_key='celery'), Broadcast('shared_vectors')]
+    CELERY_TASK_ROUTES = {
+        'accounts.tasks.publish_shared_vectors': {'queue': 'shared_vectors', 'exchange': 'shared_vectors'},
+    }
+    CELERY_BEAT_SCHEDULE['publish-shared-vectors'] = {
+        'task': 'accounts.tasks.publish_shared_vectors',
+        'schedule': timedelta(seconds=MATCHING_SHARED_VECTORS_SECONDS),
+    }
+# Days before pending matches that stopped being refreshed, and rejected
+# matches, are deleted; a deleted rejection lets the pair match again
+MATCHING_PENDING_RETENTION_DAYS = int(os.getenv('MATCHING_PENDING_RETENTION_DAYS', 30))
+MATCHING_REJECTED_RETENTION_DAYS = int(os.getenv('MATCHING_REJECTED_RETENTION_DAYS', 180))
+# Lifetime of cached pairwise scores; entries of changed vectors are never read again
+MATCHING_SCORE_CACHE_SECONDS = int(os.getenv('MATCHING_SCORE_CACHE_SECONDS', 60 * 60 * 24))
+
+# Lifetime of a rendered catalog snapshot; edits start a new version right away
+CATALOG_CACHE_SECONDS = int(os.getenv('CATALOG_CACHE_SECONDS', 60 * 60 * 24))
 
 # Debug toolbar settings
 INTERNAL_IPS = ['127.0.0.1']
@@ -0,0 +1,88 @@
+"""
+Versioned snapshot of the questionnaire catalog.
+
+Categories and their questions change only when staff edit them, so they
+are serialized once per catalog version and kept in the cache as rendered
+JSON. Saving or deleting a category or question bumps the version after
+commit; snapshots of older versions are never read again and expire after
+``CATALOG_CACHE_SECONDS``.
+
+Each category is stored as its JSON object without the closing brace, so
+per-user fields such as ``completion_percentage`` are appended to the
+bytes without parsing or re-serializing the catalog.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .models import Category
+
+VERSION_KEY = 'core:catalog:version'
+SNAPSHOT_KEY_PREFIX = 'core:catalog:snapshot'
+
+_renderer = JSONRenderer()
+# Snapshot last loaded by this process, as (version, snapshot)
+_local = (None, None)
+
+
+def render(data):
+    # JSONRenderer renders None as an empty body rather than null
+    return b'null' if data is None else _renderer.render(data)
+
+
+class CatalogEntry:
+    __slots__ = ('pk', 'questions_count', 'head')
+
+    def __init__(self, pk, questions_count, head):
+        self.pk = pk
+        self.questions_count = questions_count
+        # Rendered category object, missing its closing brace
+        self.head = head
+
+    def render(self, **fields):
+        """Return the category object with ``fields`` appended to it."""
+        parts = [self.head]
+        for name, value in fields.items():
+            parts.append(b',' + render(name) + b':' + render(value))
+        parts.append(b'}')
+        return b''.join(parts)
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def build_snapshot():
+    from .serializers import CatalogCategorySerializer
+
+    entries = []
+    for category in Category.objects.prefetch_related('questions'):
+        data = CatalogCategorySerializer(category).data
+        entries.append(CatalogEntry(category.pk, len(data['questions']), render(data)[:-1]))
+    return entries
+
+
+def get_catalog():
+    """Return the ``CatalogEntry`` list of the current catalog, in order."""
+    global _local
+
+    version = catalog_version()
+    if _local[0] == version:
+        return _local[1]
+    key = f'{SNAPSHOT_KEY_PREFIX}:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(key, snapshot, settings.CATALOG_CACHE_SECONDS)
+    _local = (version, snapshot)
+    return snapshot
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user category progress row from the responses and questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_progress(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} category progress rows'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.0 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_progress(apps, schema_editor):
+    Category = apps.get_model('core', 'Category')
+    UserCategoryProgress = apps.get_model('core', 'UserCategoryProgress')
+    UserResponse = apps.get_model('core', 'UserResponse')
+
+    totals = dict(Category.objects.annotate(count=Count('questions')).values_list('pk', 'count'))
+    answered = (
+        UserResponse.objects.filter(response__isnull=False)
+        .order_by()
+        .values_list('user_id', 'question__category_id')
+        .annotate(count=Count('pk'))
+    )
+    UserCategoryProgress.objects.bulk_create(
+        [
+            UserCategoryProgress(
+                user_id=user_id, category_id=category_id,
+                answered_count=count, total_count=totals[category_id],
+            )
+            for user_id, category_id, count in answered
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCategoryProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered_count', models.PositiveIntegerField(default=0)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_progress', to='core.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User category progress',
+                'unique_together': {('user', 'category')},
+            },
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
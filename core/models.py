@@ -1,10 +1,33 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
+class CategoryQuerySet(models.QuerySet):
+    def with_completion(self, user):
+        """
+        Annotate ``questions_count`` and ``user``'s ``answered_count`` in the
+        category query itself, for ``Category.completion_percentage``.
+
+        Answered counts are read from ``UserCategoryProgress``, one indexed
+        row per category; categories the user never answered count 0.
+        """
+        # Correlated subqueries rather than a join and GROUP BY, which would
+        # drop Meta.ordering
+        questions = Question.objects.filter(
+            category=models.OuterRef('pk')
+        ).order_by().values('category').annotate(count=models.Count('pk')).values('count')
+        progress = UserCategoryProgress.objects.filter(category=models.OuterRef('pk'), user=user)
+        return self.annotate(
+            questions_count=Coalesce(
+                models.Subquery(progress.values('total_count')), models.Subquery(questions), 0
+            ),
+            answered_count=Coalesce(models.Subquery(progress.values('answered_count')), 0),
+        )
+
 class Category(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
@@ -14,6 +37,8 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['order', 'title']
@@ -21,19 +46,25 @@ class Category(models.Model):
     def __str__(self):
         return self.title
 
-    def get_completion_percentage(self, user):
-        """Calculate the completion percentage for a user in this category."""
-        questions_count = self.questions.count()
+    @staticmethod
+    def completion_percentage(questions_count, answered_count):
         if questions_count == 0:
             return 0
-        
+        return int((answered_count / questions_count) * 100)
+
+    def get_completion_percentage(self, user):
+        """
+        Calculate the completion percentage for a user in this category.
+
+        Runs two queries; lists should use ``Category.objects.with_completion``.
+        """
+        questions_count = self.questions.count()
         answered_count = UserResponse.objects.filter(
             question__category=self,
             user=user,
             response__isnull=False
         ).count()
-        
-        return int((answered_count / questions_count) * 100)
+        return self.completion_percentage(questions_count, answered_count)
 
 class QuestionType(models.TextChoices):
     SHORT_ANSWER = 'short_answer', _('Short Answer')
@@ -117,28 +148,30 @@ class UserResponse(models.Model):
 
     def clean(self):
         from django.core.exceptions import ValidationError
-        
+        from .validators import get_validator
+
+        # Blank responses are allowed here; the API enforces ``required``
         if self.response is not None:
-            if self.question.question_type == QuestionType.SINGLE_CHOICE:
-                if not isinstance(self.response, str) or self.response not in self.question.options:
-                    raise ValidationError(
-                        {'response': _('Invalid choice selected.')}
-                    )
-            
-            elif self.question.question_type == QuestionType.MULTIPLE_CHOICE:
-                if not isinstance(self.response, list) or not all(opt in self.question.options for opt in self.response):
-                    raise ValidationError(
-                        {'response': _('Invalid choices selected.')}
-                    )
-            
-            elif self.question.question_type == QuestionType.SCALE:
-                if not isinstance(self.response, int) or not (self.question.min_value <= self.response <= self.question.max_value):
-                    raise ValidationError(
-                        {'response': _('Response must be a number within the defined range.')}
-                    )
-            
-            elif self.question.question_type == QuestionType.BOOLEAN:
-                if not isinstance(self.response, bool):
-                    raise ValidationError(
-                        {'response': _('Response must be a boolean value.')}
-                    )
+            error = get_validator(self.question).error(self.response)
+            if error:
+                raise ValidationError({'response': error})
+
+class UserCategoryProgress(models.Model):
+    """
+    Answered and total question counts of a user in a category.
+
+    Kept up to date by ``core.progress`` as responses and questions come
+    and go; ``rebuild_category_progress`` repairs any drift.
+    """
+    user = models.ForeignKey(User, related_name='category_progress', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, related_name='user_progress', on_delete=models.CASCADE)
+    answered_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'category']
+        verbose_name_plural = "User category progress"
+
+    def __str__(self):
+        return f"{self.user} - {self.category.title} ({self.answered_count}/{self.total_count})"
@@ -0,0 +1,167 @@
+"""
+Incremental maintenance of ``UserCategoryProgress``.
+
+Response and question changes are applied as ``F()`` deltas to the affected
+progress rows. A missing row is created from exact counts instead, so it
+never needs a delta on top; removals never create one, since a missing row
+already reads as nothing answered.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Category, Question, UserCategoryProgress, UserResponse
+
+
+def _exact_counts(user_id, category_id):
+    answered_count = UserResponse.objects.filter(
+        user_id=user_id, question__category_id=category_id, response__isnull=False
+    ).count()
+    return answered_count, Question.objects.filter(category_id=category_id).count()
+
+
+def apply_answered_delta(user_id, category_id, delta):
+    """Add ``delta`` answered questions to a user's progress in a category."""
+    updated = UserCategoryProgress.objects.filter(user_id=user_id, category_id=category_id).update(
+        answered_count=F('answered_count') + delta, updated_at=timezone.now()
+    )
+    if updated or delta < 0:
+        return
+    answered_count, total_count = _exact_counts(user_id, category_id)
+    try:
+        with transaction.atomic():
+            UserCategoryProgress.objects.create(
+                user_id=user_id, category_id=category_id,
+                answered_count=answered_count, total_count=total_count,
+            )
+    except IntegrityError:
+        # Created concurrently from counts that may predate this change
+        UserCategoryProgress.objects.filter(user_id=user_id, category_id=category_id).update(
+            answered_count=answered_count, total_count=total_count, updated_at=timezone.now()
+        )
+
+
+def recount_progress(user_id, category_id):
+    """
+    Rewrite a user's progress in a category from exact counts. Run it in a
+    transaction: the row is locked first, so the counts cover every response
+    committed before it and concurrent writers queue behind it.
+    """
+    progress = UserCategoryProgress.objects.select_for_update().filter(user_id=user_id, category_id=category_id)
+    if progress.values_list('pk').first() is None:
+        answered_count, total_count = _exact_counts(user_id, category_id)
+        try:
+            with transaction.atomic():
+                UserCategoryProgress.objects.create(
+                    user_id=user_id, category_id=category_id,
+                    answered_count=answered_count, total_count=total_count,
+                )
+            return
+        except IntegrityError:
+            # Created concurrently; count again once it can be locked
+            progress.values_list('pk').first()
+    answered_count, total_count = _exact_counts(user_id, category_id)
+    progress.update(answered_count=answered_count, total_count=total_count, updated_at=timezone.now())
+
+
+def apply_total_delta(category_id, delta):
+    """Add ``delta`` questions to every user's progress in a category."""
+    UserCategoryProgress.objects.filter(category_id=category_id).update(
+        total_count=F('total_count') + delta, updated_at=timezone.now()
+    )
+
+
+def _answered(question_id):
+    return UserResponse.objects.filter(question_id=question_id, response__isnull=False).values('user_id')
+
+
+def uncount_question(question):
+    """Remove a question, and its answers, from the progress in its category."""
+    UserCategoryProgress.objects.filter(category_id=question.category_id).update(
+        total_count=F('total_count') - 1, updated_at=timezone.now()
+    )
+    UserCategoryProgress.objects.filter(
+        category_id=question.category_id, user_id__in=_answered(question.pk)
+    ).update(answered_count=F('answered_count') - 1, updated_at=timezone.now())
+
+
+def move_question(question_id, old_category_id, new_category_id):
+    """
+    Move a question, and its answers, between categories. Called once the
+    question was saved in ``new_category_id``.
+    """
+    apply_total_delta(old_category_id, -1)
+    apply_total_delta(new_category_id, 1)
+    UserCategoryProgress.objects.filter(
+        category_id=old_category_id, user_id__in=_answered(question_id)
+    ).update(answered_count=F('answered_count') - 1, updated_at=timezone.now())
+    UserCategoryProgress.objects.filter(
+        category_id=new_category_id, user_id__in=_answered(question_id)
+    ).update(answered_count=F('answered_count') + 1, updated_at=timezone.now())
+
+    # Users who had no row in the new category get one from exact counts
+    missing = _answered(question_id).exclude(user__category_progress__category_id=new_category_id)
+    answered = (
+        UserResponse.objects.filter(
+            user_id__in=missing, question__category_id=new_category_id, response__isnull=False
+        )
+        .order_by()
+        .values_list('user_id')
+        .annotate(count=Count('pk'))
+    )
+    total_count = Question.objects.filter(category_id=new_category_id).count()
+    UserCategoryProgress.objects.bulk_create(
+        [
+            UserCategoryProgress(
+                user_id=user_id, category_id=new_category_id,
+                answered_count=count, total_count=total_count,
+            )
+            for user_id, count in answered
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'category'],
+        update_fields=['answered_count', 'total_count', 'updated_at'],
+    )
+
+
+def rebuild_progress(batch_size=1000):
+    """
+    Recompute every progress row from the responses and questions.
+
+    Returns the number of rows written.
+    """
+    totals = dict(Category.objects.annotate(count=Count('questions')).values_list('pk', 'count'))
+    answered = (
+        UserResponse.objects.filter(response__isnull=False)
+        .order_by()
+        .values_list('user_id', 'question__category_id')
+        .annotate(count=Count('pk'))
+    )
+    rows = [
+        UserCategoryProgress(
+            user_id=user_id, category_id=category_id,
+            answered_count=count, total_count=totals[category_id],
+        )
+        for user_id, category_id, count in answered
+    ]
+    with transaction.atomic():
+        UserCategoryProgress.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'category'],
+            update_fields=['answered_count', 'total_count', 'updated_at'],
+        )
+        # Rows of users who no longer have any answer in their category
+        stale = UserCategoryProgress.objects.exclude(
+            pk__in=UserCategoryProgress.objects.filter(
+                user__responses__response__isnull=False,
+                user__responses__question__category=F('category'),
+            ).values('pk')
+        )
+        stale.update(answered_count=0, updated_at=timezone.now())
+        for category_id, total_count in totals.items():
+            UserCategoryProgress.objects.filter(category_id=category_id).exclude(
+                total_count=total_count
+            ).update(total_count=total_count, updated_at=timezone.now())
+    return len(rows)
@@ -1,20 +1,30 @@
 from rest_framework import serializers
 from .models import Category, Question, UserResponse
+from .validators import get_validator
 
 class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ['id', 'text', 'question_type', 'options', 'min_value', 'max_value', 'required', 'order']
 
-class CategorySerializer(serializers.ModelSerializer):
+class CatalogCategorySerializer(serializers.ModelSerializer):
+    """Category fields shared by all users, see ``core.catalog``"""
     questions = QuestionSerializer(many=True, read_only=True)
-    completion_percentage = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'title', 'description', 'icon', 'color', 'order', 'questions', 'completion_percentage']
+        fields = ['id', 'title', 'description', 'icon', 'color', 'order', 'questions']
+
+class CategorySerializer(CatalogCategorySerializer):
+    completion_percentage = serializers.SerializerMethodField()
+
+    class Meta(CatalogCategorySerializer.Meta):
+        fields = CatalogCategorySerializer.Meta.fields + ['completion_percentage']
 
     def get_completion_percentage(self, obj):
+        # Annotated by Category.objects.with_completion
+        if hasattr(obj, 'answered_count'):
+            return Category.completion_percentage(obj.questions_count, obj.answered_count)
         user = self.context.get('request').user
         return obj.get_completion_percentage(user)
 
@@ -29,37 +39,10 @@ class UserResponseSerializer(serializers.ModelSerializer):
         question = data['question']
         response = data.get('response')
 
-        # Check if response is required
-        if question.required and response is None:
-            raise serializers.ValidationError({
-                'response': 'This field is required.'
-            })
-
-        # Validate response based on question type
-        if response is not None:
-            if question.question_type == 'single_choice':
-                if not isinstance(response, str) or response not in question.options:
-                    raise serializers.ValidationError({
-                        'response': 'Invalid choice selected.'
-                    })
-
-            elif question.question_type == 'multiple_choice':
-                if not isinstance(response, list) or not all(opt in question.options for opt in response):
-                    raise serializers.ValidationError({
-                        'response': 'Invalid choices selected.'
-                    })
-
-            elif question.question_type == 'scale':
-                if not isinstance(response, int) or not (question.min_value <= response <= question.max_value):
-                    raise serializers.ValidationError({
-                        'response': f'Response must be a number between {question.min_value} and {question.max_value}.'
-                    })
-
-            elif question.question_type == 'boolean':
-                if not isinstance(response, bool):
-                    raise serializers.ValidationError({
-                        'response': 'Response must be a boolean value.'
-                    })
+        # Validate response based on question type, including ``required``
+        error = get_validator(question).error(response)
+        if error:
+            raise serializers.ValidationError({'response': error})
 
         return data
 
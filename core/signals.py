@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import Category, Question, UserResponse
+from .progress import apply_answered_delta, apply_total_delta, move_question, uncount_question
+from .validators import forget_validator
+
+User = get_user_model()
+
+
+def _origin_model(origin):
+    # ``origin`` is the instance or queryset whose delete() started the deletion
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def _category_id(response, categories=None):
+    # ``categories`` memoizes question lookups shared by several responses
+    if UserResponse.question.is_cached(response):
+        return response.question.category_id
+    categories = {} if categories is None else categories
+    if response.question_id not in categories:
+        categories[response.question_id] = Question.objects.filter(
+            pk=response.question_id
+        ).values_list('category_id', flat=True).first()
+    return categories[response.question_id]
+
+
+@receiver(pre_save, sender=UserResponse)
+def remember_answered(sender, instance, **kwargs):
+    instance._was_answered = bool(instance.pk) and UserResponse.objects.filter(
+        pk=instance.pk, response__isnull=False
+    ).exists()
+
+
+@receiver(post_save, sender=UserResponse)
+def count_response(sender, instance, **kwargs):
+    delta = (instance.response is not None) - instance._was_answered
+    if delta:
+        apply_answered_delta(instance.user_id, _category_id(instance), delta)
+
+
+@receiver(post_delete, sender=UserResponse)
+def uncount_response(sender, instance, origin, **kwargs):
+    # Deleted users and categories take their progress rows with them, and
+    # a deleted question uncounts all of its answers at once
+    if instance.response is not None and _origin_model(origin) not in (User, Category, Question):
+        # Once per question for all the responses of one delete
+        categories = vars(origin).setdefault('_response_categories', {})
+        apply_answered_delta(instance.user_id, _category_id(instance, categories), -1)
+
+
+@receiver(pre_save, sender=Question)
+def remember_category(sender, instance, **kwargs):
+    instance._old_category_id = instance.pk and Question.objects.filter(
+        pk=instance.pk
+    ).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Question)
+def count_question(sender, instance, created, **kwargs):
+    if created:
+        apply_total_delta(instance.category_id, 1)
+    elif instance._old_category_id and instance._old_category_id != instance.category_id:
+        move_question(instance.pk, instance._old_category_id, instance.category_id)
+
+
+@receiver(pre_delete, sender=Question)
+def uncount_deleted_question(sender, instance, origin, **kwargs):
+    # Before the delete, while its answers can still be found
+    if _origin_model(origin) is not Category:
+        uncount_question(instance)
+
+
+@receiver(post_delete, sender=Question)
+def forget_question(sender, instance, **kwargs):
+    forget_validator(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_catalog(sender, **kwargs):
+    # After commit, so a concurrent rebuild cannot store old rows under the new version
+    transaction.on_commit(bump_catalog_version)
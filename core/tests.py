@@ -1,3 +1,199 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.factories import UserFactory
+
+from .catalog import bump_catalog_version
+from .models import Category, Question, UserCategoryProgress, UserResponse
+from .progress import rebuild_progress
+from .validators import get_validator
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProgressTests(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        self.users = UserFactory.create_batch(3)
+        for user in self.users:
+            for question in Question.objects.all():
+                UserResponse.objects.create(user=user, question=question, response=True)
+
+    def progress(self, user, category_id):
+        return UserCategoryProgress.objects.filter(user=user, category_id=category_id).values_list(
+            'answered_count', 'total_count'
+        ).first()
+
+    def assertProgressExact(self):
+        rows = sorted(UserCategoryProgress.objects.values_list('user', 'category', 'answered_count', 'total_count'))
+        rebuild_progress()
+        self.assertEqual(
+            rows,
+            sorted(UserCategoryProgress.objects.values_list('user', 'category', 'answered_count', 'total_count')),
+        )
+
+    def test_responses_are_counted(self):
+        self.assertEqual(self.progress(self.users[0], 1), (2, 2))
+        self.assertProgressExact()
+
+    def test_cleared_response_is_uncounted(self):
+        response = UserResponse.objects.get(user=self.users[0], question_id=1)
+        response.response = None
+        response.save()
+
+        self.assertEqual(self.progress(self.users[0], 1), (1, 2))
+        self.assertProgressExact()
+
+    def test_response_delete_is_uncounted(self):
+        UserResponse.objects.filter(question__category_id=1).delete()
+
+        self.assertEqual(self.progress(self.users[0], 1), (0, 2))
+        self.assertProgressExact()
+
+    def test_question_delete(self):
+        Question.objects.get(pk=1).delete()
+
+        self.assertEqual(self.progress(self.users[0], 1), (1, 1))
+        self.assertProgressExact()
+
+    def test_question_delete_uncounts_responses_in_bulk(self):
+        question = Question.objects.get(pk=1)
+
+        # Collect, two progress updates, two deletes: none per response
+        with self.assertNumQueries(5):
+            question.delete()
+
+    def test_question_create(self):
+        Question.objects.create(category_id=1, text='New question')
+
+        self.assertEqual(self.progress(self.users[0], 1), (2, 3))
+        self.assertProgressExact()
+
+    def test_question_move(self):
+        question = Question.objects.get(pk=1)
+        question.category_id = 2
+        question.save()
+
+        self.assertEqual(self.progress(self.users[0], 1), (1, 1))
+        self.assertEqual(self.progress(self.users[0], 2), (3, 3))
+        self.assertProgressExact()
+
+    def test_question_move_to_unanswered_category(self):
+        category = Category.objects.create(title='New', description='New', icon='Icon', color='#000000')
+        question = Question.objects.get(pk=1)
+        question.category = category
+        question.save()
+
+        self.assertEqual(self.progress(self.users[0], category.pk), (1, 1))
+        self.assertProgressExact()
+
+    def test_user_delete(self):
+        self.users[0].delete()
+
+        self.assertFalse(UserCategoryProgress.objects.filter(user_id=self.users[0].pk).exists())
+        self.assertProgressExact()
+
+    def test_category_delete(self):
+        Category.objects.filter(pk=1).delete()
+
+        self.assertFalse(UserCategoryProgress.objects.filter(category_id=1).exists())
+        self.assertProgressExact()
+
+    def test_bulk_update(self):
+        user = UserFactory()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post('/api/v1/profile/responses/bulk_update/', {
+            'category_id': 2,
+            'responses': [{'question': 3, 'response': 'Master'}, {'question': 4, 'response': 11}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertEqual(self.progress(user, 2), (1, 2))
+        self.assertProgressExact()
+
+    def test_bulk_update_resubmit_is_not_counted_twice(self):
+        user = UserFactory()
+        client = APIClient()
+        client.force_authenticate(user)
+        data = {'category_id': 2, 'responses': [{'question': 3, 'response': 'Master'}, {'question': 4, 'response': 5}]}
+
+        client.post('/api/v1/profile/responses/bulk_update/', data, format='json')
+        response = client.post('/api/v1/profile/responses/bulk_update/', data, format='json')
+
+        self.assertEqual(response.data['completion_percentage'], 100.0)
+        self.assertEqual(self.progress(user, 2), (2, 2))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogTests(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        bump_catalog_version()
+        self.user = UserFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_revalidated_with_etag(self):
+        response = self.client.get('/api/v1/profile/categories/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/v1/profile/categories/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_progress(self):
+        etag = self.client.get('/api/v1/profile/categories/1/')['ETag']
+        UserResponse.objects.create(user=self.user, question_id=1, response='Kind')
+
+        response = self.client.get('/api/v1/profile/categories/1/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_responses'], {'1': 'Kind'})
+        self.assertEqual(response.json()['completion_percentage'], 50.0)
+
+    def test_unknown_category_is_not_found(self):
+        self.assertEqual(self.client.get('/api/v1/profile/categories/999/').status_code, 404)
+
+
+class ResponseValidatorTests(TestCase):
+    fixtures = ['initial_data']
+
+    def error(self, question_id, response):
+        return get_validator(Question.objects.get(pk=question_id)).error(response)
+
+    def test_choices(self):
+        self.assertIsNone(self.error(3, 'Master'))
+        self.assertIsNotNone(self.error(3, 'Mastery'))
+        self.assertIsNone(self.error(5, ['Music', 'Travel']))
+        self.assertIsNotNone(self.error(5, ['Music', 'Knitting']))
+        self.assertIsNotNone(self.error(5, 'Music'))
+
+    def test_scale_and_boolean(self):
+        self.assertIsNone(self.error(4, 10))
+        self.assertIsNotNone(self.error(4, 11))
+        self.assertIsNotNone(self.error(4, '5'))
+        self.assertIsNone(self.error(7, False))
+        self.assertIsNotNone(self.error(7, 'yes'))
+
+    def test_required(self):
+        self.assertIsNotNone(self.error(1, None))
+        question = Question.objects.get(pk=1)
+        question.required = False
+        question.save()
+
+        self.assertIsNone(self.error(1, None))
+
+    def test_recompiled_when_the_question_changes(self):
+        question = Question.objects.get(pk=3)
+        validator = get_validator(question)
+        self.assertIs(get_validator(Question.objects.get(pk=3)), validator)
+
+        question.options = question.options + ['Apprenticeship']
+        question.save()
+
+        self.assertIsNone(get_validator(Question.objects.get(pk=3)).error('Apprenticeship'))
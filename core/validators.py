@@ -0,0 +1,71 @@
+"""
+Compiled response validators, one per question.
+
+A question's options and scale bounds are extracted once into a
+``ResponseValidator``; choices are checked against a frozenset. Validators
+are cached per question and recompiled when its ``updated_at`` changes.
+"""
+from django.utils.translation import gettext_lazy as _
+
+from .models import QuestionType
+
+_validators = {}
+
+
+class ResponseValidator:
+    __slots__ = ('question_type', 'required', 'options', 'min_value', 'max_value')
+
+    def __init__(self, question):
+        self.question_type = question.question_type
+        self.required = question.required
+        self.options = frozenset(option for option in question.options or () if isinstance(option, str))
+        self.min_value = question.min_value
+        self.max_value = question.max_value
+
+    def error(self, response):
+        """Return why ``response`` is invalid, or ``None``."""
+        if response is None:
+            return _('This field is required.') if self.required else None
+
+        if self.question_type == QuestionType.SINGLE_CHOICE:
+            if not isinstance(response, str) or response not in self.options:
+                return _('Invalid choice selected.')
+
+        elif self.question_type == QuestionType.MULTIPLE_CHOICE:
+            if not isinstance(response, list) or not all(
+                isinstance(option, str) and option in self.options for option in response
+            ):
+                return _('Invalid choices selected.')
+
+        elif self.question_type == QuestionType.SCALE:
+            if (
+                not isinstance(response, int)
+                or self.min_value is None
+                or self.max_value is None
+                or not self.min_value <= response <= self.max_value
+            ):
+                return _('Response must be a number between %(min)s and %(max)s.') % {
+                    'min': self.min_value, 'max': self.max_value,
+                }
+
+        elif self.question_type == QuestionType.BOOLEAN:
+            if not isinstance(response, bool):
+                return _('Response must be a boolean value.')
+
+        return None
+
+
+def get_validator(question):
+    """Return the compiled validator of ``question``."""
+    if question.pk is None:
+        return ResponseValidator(question)
+    cached = _validators.get(question.pk)
+    if cached is not None and cached[0] == question.updated_at:
+        return cached[1]
+    validator = ResponseValidator(question)
+    _validators[question.pk] = (question.updated_at, validator)
+    return validator
+
+
+def forget_validator(question_id):
+    _validators.pop(question_id, None)
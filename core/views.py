@@ -2,29 +2,106 @@ from django.shortcuts import render
 
 # Create your views here.
 
+import hashlib
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 
-from .models import Category, Question, UserResponse
+from .catalog import get_catalog, render as render_json
+from .models import Category, Question, UserCategoryProgress, UserResponse
+from .progress import recount_progress
 from .serializers import (
     CategorySerializer,
     CategoryDetailSerializer,
     QuestionSerializer,
     UserResponseSerializer,
 )
+from .validators import get_validator
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.prefetch_related('questions').all()
     permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return super().get_queryset().with_completion(self.request.user)
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return CategoryDetailSerializer
         return CategorySerializer
 
+    # list and retrieve are served from the rendered catalog snapshot with
+    # the user's fields appended; see core.catalog
+
+    def _completion(self, entries):
+        progress = {
+            category_id: (answered_count, total_count)
+            for category_id, answered_count, total_count in UserCategoryProgress.objects.filter(
+                user=self.request.user, category__in=[entry.pk for entry in entries]
+            ).values_list('category', 'answered_count', 'total_count')
+        }
+        completion = {}
+        for entry in entries:
+            answered_count, total_count = progress.get(entry.pk, (0, entry.questions_count))
+            completion[entry.pk] = Category.completion_percentage(total_count, answered_count)
+        return completion
+
+    def _conditional_response(self, content):
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        # Per-user content; clients revalidate with If-None-Match
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        entries = get_catalog()
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            entries = page
+        completion = self._completion(entries)
+        results = b'[' + b','.join(
+            entry.render(completion_percentage=completion[entry.pk]) for entry in entries
+        ) + b']'
+        if page is None:
+            return self._conditional_response(results)
+        # Same envelope as PageNumberPagination.get_paginated_response
+        return self._conditional_response(b''.join([
+            b'{"count":', render_json(self.paginator.page.paginator.count),
+            b',"next":', render_json(self.paginator.get_next_link()),
+            b',"previous":', render_json(self.paginator.get_previous_link()),
+            b',"results":', results, b'}',
+        ]))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        entry = next((entry for entry in get_catalog() if entry.pk == pk), None)
+        if entry is None:
+            raise Http404
+        user_responses = {
+            str(question_id): response
+            for question_id, response in UserResponse.objects.filter(
+                user=request.user, question__category_id=pk
+            ).values_list('question_id', 'response')
+        }
+        return self._conditional_response(entry.render(
+            completion_percentage=self._completion([entry])[pk],
+            user_responses=user_responses,
+        ))
+
     @action(detail=True, methods=['get'])
     def questions(self, request, pk=None):
         category = self.get_object()
@@ -51,6 +128,8 @@ class UserResponseViewSet(viewsets.ModelViewSet):
                 {"question": 2, "response": ["option1", "option2"]}
             ]
         }
+        Valid responses are saved in one upsert; invalid ones are listed
+        under "errors" with their index instead of failing the batch.
         """
         category_id = request.data.get('category_id')
         responses_data = request.data.get('responses', [])
@@ -62,38 +141,51 @@ class UserResponseViewSet(viewsets.ModelViewSet):
             )
 
         category = get_object_or_404(Category, id=category_id)
-        
-        # Validate all questions belong to the category
-        question_ids = [resp['question'] for resp in responses_data]
-        valid_questions = set(category.questions.values_list('id', flat=True))
-        if not all(qid in valid_questions for qid in question_ids):
-            return Response(
-                {'error': 'All questions must belong to the specified category'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        questions = {question.pk: question for question in category.questions.all()}
 
-        try:
-            with transaction.atomic():
-                for response_data in responses_data:
-                    question_id = response_data['question']
-                    response_value = response_data['response']
-
-                    # Update or create response
-                    response, created = UserResponse.objects.update_or_create(
-                        user=request.user,
-                        question_id=question_id,
-                        defaults={'response': response_value}
-                    )
-
-            # Return updated category data
-            serializer = CategoryDetailSerializer(
-                category,
-                context={'request': request}
-            )
-            return Response(serializer.data)
+        # Validate every response in memory; invalid items are reported
+        # without failing the rest of the batch
+        rows = []
+        errors = []
+        for index, response_data in enumerate(responses_data):
+            try:
+                question = questions.get(response_data['question'])
+                response_value = response_data.get('response')
+            except (KeyError, TypeError):
+                errors.append({'index': index, 'error': 'Each response needs a question'})
+                continue
+            if question is None:
+                errors.append({'index': index, 'question': response_data['question'],
+                               'error': 'Question does not belong to the specified category'})
+                continue
+            error = get_validator(question).error(response_value)
+            if error:
+                errors.append({'index': index, 'question': question.pk, 'error': error})
+                continue
+            rows.append(UserResponse(user=request.user, question=question, response=response_value))
 
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_400_BAD_REQUEST
+        if not rows:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Later items win over earlier ones for the same question
+        rows = list({row.question_id: row for row in rows}.values())
+        with transaction.atomic():
+            UserResponse.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['user', 'question'],
+                update_fields=['response', 'updated_at'],
             )
+            # Bulk writes skip the signals that keep progress up to date,
+            # and which responses were answered before is unknown after the upsert
+            recount_progress(request.user.pk, category.pk)
+
+        # Return updated category data
+        serializer = CategoryDetailSerializer(
+            Category.objects.with_completion(request.user).get(pk=category.pk),
+            context={'request': request}
+        )
+        data = serializer.data
+        if errors:
+            data['errors'] = errors
+        return Response(data)